@@ -6,13 +6,22 @@ import json
 import logging
 import os
 import sys
+import time
 
-from src.Config import CICmdline, CIConfig
+from src.Config import CICmdline, CIConfig, get_cache_dir
+from src.artifact_index import ArtifactIndex
+from src.ci_state import RunJournal, TestedState
 from src.CTTFormatter import CTTFormatter
-from src.crawlers import FreeElectronsCrawler, KernelCICrawler
-from src.crawlers import RemoteAccessError, RemoteEmptyError
+from src.crawlers import CrawlerChain, FreeElectronsCrawler, KernelCICrawler
+from src.crawlers import RemoteEmptyError
+from src.dedup import DEFAULT_IGNORED_FIELDS, JobDeduplicator
+from src.http_client import HTTPClient
+from src.release_cache import ReleaseCache
 from src.rootfs_chooser import RootfsChooser, RootfsAccessError
 from src.launcher import BaseLauncher
+from src.executor import MatrixExecutor, Progress
+from src.planner import group_by_board, make_plan, shard, summarize
+from src.submitter import Submitter, get_token_bucket
 
 class CILauncher(BaseLauncher):
     """
@@ -31,10 +40,221 @@ class CILauncher(BaseLauncher):
 
         with open(os.path.join(ctt_root_location, "ci_tests.json")) as f:
             self._tests_config = json.load(f)
-        self._crawlers = [
-                FreeElectronsCrawler(self._cfg),
-                KernelCICrawler(self._cfg)
-            ]
+        with open(os.path.join(ctt_root_location, "tests.json")) as f:
+            self._tests = json.load(f)
+        # Releases can't change during a run, unless told otherwise
+        if 'release_cache_ttl' in self._cfg:
+            ttl = float(self._cfg['release_cache_ttl'])
+        else:
+            ttl = None
+        self._release_cache = ReleaseCache(ttl)
+        self._http = HTTPClient.from_config(self._cfg)
+        if self._cfg['no_cache']:
+            self._index = None
+            self._state = None
+        else:
+            cache_dir = get_cache_dir(self._cfg)
+            if 'negative_cache_ttl' in self._cfg:
+                negative_ttl = float(self._cfg['negative_cache_ttl'])
+            else:
+                negative_ttl = 600
+            self._index = ArtifactIndex(
+                os.path.join(cache_dir, 'artifacts.sqlite'), negative_ttl)
+            self._state = TestedState(os.path.join(cache_dir, 'tested.json'))
+        self._crawlers = CrawlerChain(self._cfg['race_crawlers'])
+        # Our own builds take precedence over KernelCI's ones
+        self._crawlers.add(FreeElectronsCrawler(self._cfg,
+                                                self._release_cache,
+                                                self._http, self._index), 0)
+        self._crawlers.add(KernelCICrawler(self._cfg, self._release_cache,
+                                           self._http, self._index), 1)
+        self._rootfs_chooser = RootfsChooser(self._http, self._index)
+        self._dedup = self._get_deduplicator()
+
+    def _get_deduplicator(self):
+        if self._cfg['no_dedup']:
+            return None
+
+        if 'dedup_ignored_fields' in self._cfg:
+            ignored_fields = self._cfg['dedup_ignored_fields'].split()
+        else:
+            ignored_fields = DEFAULT_IGNORED_FIELDS
+        if 'dedup_window' in self._cfg and not self._cfg['no_cache']:
+            window = float(self._cfg['dedup_window'])
+            path = os.path.join(get_cache_dir(self._cfg), 'submitted.json')
+        else:
+            window = None
+            path = None
+
+        return JobDeduplicator(ignored_fields, window, path)
+
+    def _get_job_specs(self, board, specs, rootfs):
+        """
+        Crawls the artifacts of the jobs planned on a board, and yields the
+        (board, artifacts, test, job name) tuples to render them with, as they
+        are found.
+        """
+        # Several tests usually share the same configs
+        crawls = {}
+        test = None
+        for spec in specs:
+            progress = self._progress.step()
+            if spec.test != test:
+                test = spec.test
+                logging.info(" Building job(s) for %s" % test)
+
+            crawl_key = (spec.tree, spec.branch, spec.defconfig)
+            if crawl_key not in crawls:
+                logging.info("  Fetching artifacts for %s -> %s -> %s" %
+                             crawl_key)
+                try:
+                    with self._executor.stage('crawl'):
+                        crawls[crawl_key] = self._crawlers.crawl(
+                                self._boards_config[board], *crawl_key)
+                except RemoteEmptyError:
+                    crawls[crawl_key] = None
+
+            if not crawls[crawl_key]:
+                logging.error("  No artifacts found for %s -> %s -> %s" %
+                              crawl_key)
+                continue
+
+            artifacts = dict(crawls[crawl_key])
+            if (self._cfg['only_new'] and not self._cfg['force'] and
+                    self._state and
+                    not self._state.is_new(board, spec.tree, spec.branch,
+                                           spec.defconfig, spec.test,
+                                           artifacts['release'])):
+                logging.info("  Release %s already tested, skipping" %
+                             artifacts['release'])
+                continue
+
+            artifacts['rootfs'] = rootfs
+            logging.info("  Making %s job on %s -> %s -> %s %s" %
+                    (spec.test, spec.tree, spec.branch, spec.defconfig,
+                     progress))
+            for key in ['kernel', 'dtb', 'modules']:
+                if key in artifacts:
+                    logging.debug("    %s: %s" % (key, artifacts[key]))
+            yield (board, artifacts, spec.test, spec.job_name)
+
+    def _launch_board(self, item):
+        """
+        Crawls the artifacts of the jobs planned on a board, and makes them.
+        `item` is a (board, list of `JobSpec`) couple.
+        """
+        board, specs = item
+        logging.info(board)
+        if not specs:
+            logging.info("  No test set")
+            return
+
+        try:
+            rootfs = self._rootfs_chooser.get_url(self._boards_config[board])
+        except RootfsAccessError as e:
+            logging.warning(e)
+            return
+
+        planned = dict((spec.job_name, spec) for spec in specs)
+        jobs = self.crafter.render_many(self._get_job_specs(board, specs,
+                                                            rootfs))
+        if self._dedup:
+            jobs = self._dedup.filter(jobs)
+        for job, out in self._submitter.submit_many(jobs):
+            if not out:
+                if self._dedup:
+                    self._dedup.discard(job)
+                continue
+
+            for output in out:
+                logging.info("  ==> Job saved to: %s" % output)
+            if not self._cfg['no_send']:
+                self._record(planned[job.name], job)
+
+    def _record(self, spec, job):
+        """
+        Records that the `RenderedJob` `job`, planned as the `JobSpec` `spec`,
+        was sent.
+        """
+        release = job.spec[1]['release']
+        if self._state:
+            self._state.record(spec.board, spec.tree, spec.branch,
+                               spec.defconfig, spec.test, release)
+        if self._journal:
+            self._journal.record(spec, release)
+        if self._dedup:
+            self._dedup.record(job)
+
+    def _record_flushed(self, jobs):
+        """
+        Records the jobs sent from the outbox as if they were sent by a run,
+        in the journal of the run that spooled them, if it didn't finish.
+        """
+        planned = dict((spec.job_name, spec) for spec in
+                       make_plan(self._tests_config,
+                                 sorted(self._tests_config)))
+        self._journal = RunJournal(self._get_journal_path(), resume=True)
+        try:
+            if not self._journal.resumed:
+                # There is no run to resume
+                self._journal.finish()
+                self._journal.close()
+                self._journal = None
+            for job in jobs:
+                # The jobs of ctt.py, or spooled by an older version, can't
+                # be matched to a CI job
+                if job.spec is None or job.name not in planned:
+                    continue
+                self._record(planned[job.name], job)
+        finally:
+            if self._journal:
+                self._journal.close()
+            if self._state:
+                self._state.save()
+            if self._dedup:
+                self._dedup.save()
+
+    def _get_submitter(self):
+        bucket = None
+        if 'submit_rate' in self._cfg and not self._cfg['no_send']:
+            if 'submit_burst' in self._cfg:
+                burst = int(self._cfg['submit_burst'])
+            else:
+                burst = 1
+            bucket = get_token_bucket(self._cfg['server'],
+                                      float(self._cfg['submit_rate']), burst)
+
+        return Submitter(self.crafter.writer, self._cfg['submit_workers'],
+                         bucket)
+
+    def _get_journal_path(self):
+        if 'shard' in self._cfg:
+            name = 'journal-%d-of-%d.jsonl' % self._cfg['shard']
+        else:
+            name = 'journal.jsonl'
+        return os.path.join(get_cache_dir(self._cfg), name)
+
+    def _open_journal(self):
+        """
+        Opens the journal of the run, replaying the one of the previous run
+        when resuming it.
+        """
+        journal = RunJournal(self._get_journal_path(), self._cfg['resume'])
+        if self._cfg['resume'] and not journal.resumed:
+            logging.info("No unfinished run to resume, starting over")
+        if journal.resumed:
+            entries = journal.entries()
+            logging.info("Resuming the run started on %s, %d jobs already "
+                         "sent" % (time.ctime(journal.started_on),
+                                   len(entries)))
+            # The state of a run that died was never saved
+            if self._state:
+                for entry in entries:
+                    self._state.record(entry['board'], entry['tree'],
+                                       entry['branch'], entry['defconfig'],
+                                       entry['test'], entry['release'])
+
+        return journal
 
     def launch(self):
         if self._cfg['list']:
@@ -42,62 +262,73 @@ class CILauncher(BaseLauncher):
             for b in sorted(self._boards_config):
                 print("  - %s" % b)
             return
-        for board in self._cfg['boards']:
 
-            logging.info(board)
-            if not self._tests_config[board]['tests']:
-                logging.info("  No test set")
+        if self._cfg['flush']:
+            self._flush()
+            return
 
-            try:
-                rootfs = RootfsChooser().get_url(self._boards_config[board])
-            except RootfsAccessError as e:
-                logging.warning(e)
-                continue
-            for test in self._tests_config[board]['tests']:
-                logging.info(" Building job(s) for %s" % test['name'])
-
-                # Check if configs has been overridden by test
-                if 'configs' in test:
-                    configs = test['configs']
-                    logging.debug("  Configs overridden: %s" % configs)
-                else:
-                    configs = self._tests_config[board]['configs']
-                    logging.debug("  Using default configs: %s" % configs)
-
-                # Check if we need to exclude some configs
-                if 'exclude_configs' in test:
-                    exclude_configs = test['exclude_configs']
-                    logging.debug("  Configs excluded: %s" % exclude_configs)
-                    for exclude in exclude_configs:
-                        configs.remove(exclude)
-                    logging.debug("  Using new configs: %s" % configs)
-
-                for config in configs:
-                    logging.info("  Fetching artifacts for %s" % config)
-                    artifacts = None
-                    for crawler in self._crawlers:
-                        try:
-                            artifacts = crawler.crawl(self._boards_config[board],
-                                    config['tree'], config['branch'],
-                                    config['defconfig'])
-                        except RemoteEmptyError as e:
-                            logging.debug("  No artifacts returned by crawler %s: %s" %
-                                    (crawler.__class__.__name__, e))
-                        except RemoteAccessError as e:
-                            logging.warning("  Remote unreachable for crawler %s: %s" %
-                                    (crawler.__class__.__name__, e))
-                    if artifacts:
-                        artifacts['rootfs'] = rootfs
-                        logging.info("  Making %s job on %s -> %s -> %s" %
-                                (test['name'], config['tree'], config['branch'],
-                                    config['defconfig']))
-                        job_name = "%s--%s--%s--%s--%s" % (
-                                board, config['tree'], config['branch'],
-                                config['defconfig'], test['name']
-                                )
-                        self.crafter.make_jobs(board, artifacts, test['name'], job_name)
-                    else:
-                        logging.error("  No artifacts found")
+        plan = make_plan(self._tests_config, self._cfg['boards'])
+        jobs = group_by_board(plan)
+        if 'shard' in self._cfg:
+            index, count = self._cfg['shard']
+            # Balance the shards on the expected duration of the jobs
+            plan = shard(plan, index, count,
+                         lambda spec: self._tests.get(spec.test, {}).get(
+                             'timeout', 1))
+            logging.info("Shard %d/%d: %d jobs" % (index, count, len(plan)))
+        if self._cfg['plan']:
+            print(json.dumps(summarize(plan), indent=2, sort_keys=True))
+            return
+
+        # Nothing is sent, so there is nothing to journal
+        self._journal = None
+        if not self._cfg['no_send']:
+            self._journal = self._open_journal()
+        if self._journal and self._journal.resumed:
+            plan = tuple(spec for spec in plan
+                         if not self._journal.is_done(spec.job_name))
+        pending = group_by_board(plan)
+        self._progress = Progress(len(plan))
+        self._executor = MatrixExecutor(self._cfg['workers'], {
+            'crawl': self._cfg['crawl_workers'],
+        })
+        self._submitter = self._get_submitter()
+        self._crawlers.prefetch_releases(
+                sorted(set((spec.tree, spec.branch) for spec in plan)))
+        try:
+            # Boards whose jobs were all sent by the resumed run, or all
+            # belong to other shards, are left out
+            self._executor.run([(board, pending.get(board, []))
+                                for board in self._cfg['boards']
+                                if board in pending or board not in jobs],
+                               self._launch_board)
+            if self._journal:
+                self._journal.finish()
+        finally:
+            self._submitter.close()
+            if self._journal:
+                self._journal.close()
+            if self._state:
+                self._state.save()
+            if self._dedup:
+                self._dedup.save()
+
+        if self._dedup and self._dedup.get_dropped():
+            dropped = self._dedup.get_dropped()
+            logging.info("%d duplicated jobs not sent:" % len(dropped))
+            for name, reason in dropped:
+                logging.info("  %s: %s" % (name, reason))
+        logging.debug("Release cache: %(hits)d hits, %(misses)d misses" %
+                      self._release_cache.stats())
+        logging.debug("Jobs sent: %(count)d, %(average).2fs after being "
+                      "rendered on average, %(max).2fs at most" %
+                      self._submitter.stats())
+        logging.debug("HTTP requests sent: %d" %
+                      self._http.get_requests_count())
+        for name, stats in sorted(self._crawlers.stats().items()):
+            logging.debug("%s: served %d, found %d, empty %d, unreachable %d" %
+                          (name, stats['served'], stats['found'],
+                           stats['empty'], stats['unreachable']))
 
 
 if __name__ == "__main__":
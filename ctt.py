@@ -58,6 +58,11 @@ class CTTLauncher(BaseLauncher):
             for b in sorted(self._boards_config):
                 print("  - %s" % b)
             return
+
+        if self._cfg['flush']:
+            self._flush()
+            return
+
         for board in self._cfg['boards']:
             logging.info(board)
 
@@ -4,12 +4,16 @@
 # Florent Jacquet <florent.jacquet@free-electrons.com>
 #
 
+import os
 import sys
 import ruamel.yaml
-from xmlrpc import client
 from flask import Flask, render_template
 from datetime import datetime
 
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.realpath(__file__)),
+                                '..'))
+from src.lava_client import get_server_proxy
+
 
 hostname = "farm"
 
@@ -20,7 +24,7 @@ with open("credentials", "r") as f:
     username = f.readline().strip()
     token = f.readline().strip()
 
-server = client.ServerProxy("http://%s:%s@%s/RPC2" % (username, token, hostname))
+server = get_server_proxy("http://%s:%s@%s/RPC2" % (username, token, hostname))
 
 print(server.system.listMethods())
 
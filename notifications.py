@@ -7,13 +7,14 @@
 import json
 import os
 
-from xmlrpc import client
 from pprint import pprint
 from datetime import datetime, timedelta
 from collections import OrderedDict
 
 import configparser
 
+from src.lava_client import get_server_proxy
+
 import smtplib
 from email.mime.text import MIMEText
 
@@ -43,10 +44,12 @@ with open(os.path.join(ctt_root_location, "ci_tests.json")) as f:
     boards_config = json.load(f)
 
 # Get LAVA API handler
-lava_api = client.ServerProxy("http://%s:%s@%s/RPC2" % (
+lava_api = get_server_proxy("http://%s:%s@%s/RPC2" % (
     config.get("lava", "user"),
     config.get("lava", "token"),
-    config.get("lava", "hostname")), allow_none=True)
+    config.get("lava", "hostname")),
+    timeout=config.getfloat("lava", "timeout", fallback=60),
+    allow_none=True)
 
 # Define a Job class to ease processing
 class Job(object):
@@ -1,3 +1,5 @@
+import os
+
 from configparser import ConfigParser
 
 from src.cmdline import CICmdline, CTTCmdline, OptionError
@@ -11,6 +13,18 @@ class ConfigFileError(BaseError):
 
 DEFAULT_SECTION = 'ctt'
 
+DEFAULT_CACHE_DIR = '~/.cache/ctt'
+
+
+def get_cache_dir(cfg):
+    """
+    Returns the directory where the data kept from one run to the other is
+    stored, given by the `cache_dir` key of `cfg`, or `DEFAULT_CACHE_DIR`.
+    """
+    if 'cache_dir' in cfg:
+        return os.path.expanduser(cfg['cache_dir'])
+
+    return os.path.expanduser(DEFAULT_CACHE_DIR)
 
 
 class Config:
@@ -0,0 +1,121 @@
+import os
+import sqlite3
+import threading
+import time
+
+import requests
+
+from src.http_client import ArtifactInfo
+
+
+class ArtifactIndex(object):
+    """
+    This class is a persistent index of the remote artifacts, stored in a
+    SQLite database and keyed by URL.
+
+    Published builds don't change once they appear, so the index remembers the
+    ETag, Last-Modified date and size of every artifact found, and revalidates
+    them with conditional requests, which are answered with an empty 304 when
+    nothing changed. Missing artifacts are remembered too, but only for
+    `negative_ttl` seconds, since they may show up at any time.
+
+    A single instance can be shared by several threads.
+    """
+    _SCHEMA = '''
+        CREATE TABLE IF NOT EXISTS artifacts (
+            url TEXT PRIMARY KEY,
+            found INTEGER NOT NULL,
+            size INTEGER,
+            last_modified TEXT,
+            etag TEXT,
+            checked_on REAL NOT NULL
+        )
+    '''
+
+    def __init__(self, path, negative_ttl=600):
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+
+        self._negative_ttl = negative_ttl
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False,
+                                   isolation_level=None)
+        with self._lock:
+            self._db.execute(self._SCHEMA)
+
+    def lookup(self, url):
+        """
+        Returns a (found, ArtifactInfo) couple for `url`, or None if the index
+        knows nothing about it, or if it is a missing artifact whose entry
+        expired.
+        """
+        with self._lock:
+            row = self._db.execute(
+                'SELECT found, size, last_modified, etag, checked_on '
+                'FROM artifacts WHERE url = ?', (url,)).fetchone()
+
+        if row is None:
+            return None
+
+        found, size, last_modified, etag, checked_on = row
+        if not found and time.time() - checked_on >= self._negative_ttl:
+            return None
+
+        return bool(found), ArtifactInfo(url, size, last_modified, etag)
+
+    def __store(self, url, found, size=None, last_modified=None, etag=None):
+        with self._lock:
+            self._db.execute(
+                'INSERT OR REPLACE INTO artifacts '
+                '(url, found, size, last_modified, etag, checked_on) '
+                'VALUES (?, ?, ?, ?, ?, ?)',
+                (url, int(found), size, last_modified, etag, time.time()))
+
+    def store(self, info):
+        """
+        Records the artifact described by the `ArtifactInfo` `info` as found.
+        """
+        self.__store(info.url, True, info.size, info.last_modified, info.etag)
+
+    def store_missing(self, url):
+        """
+        Records the artifact at `url` as missing.
+        """
+        self.__store(url, False)
+
+    def probe(self, http, url):
+        """
+        Works like `HTTPClient.probe`, on the `http` client, but goes through
+        the index: known missing artifacts fail without any request, and known
+        ones are revalidated with a conditional request.
+        """
+        entry = self.lookup(url)
+        headers = {}
+        if entry is not None:
+            found, info = entry
+            if not found:
+                raise requests.exceptions.HTTPError(
+                    '404 Client Error: Not Found (cached) for url: %s' % url)
+            if info.etag:
+                headers['If-None-Match'] = info.etag
+            if info.last_modified:
+                headers['If-Modified-Since'] = info.last_modified
+
+        try:
+            new_info = http.probe(url, headers or None)
+        except requests.exceptions.HTTPError as e:
+            if e.response is not None and e.response.status_code == 404:
+                self.store_missing(url)
+            raise
+
+        if new_info is None:
+            # Not modified
+            self.store(info)
+            return info
+
+        self.store(new_info)
+        return new_info
+
+    def close(self):
+        with self._lock:
+            self._db.close()
@@ -0,0 +1,150 @@
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from src.fileutils import write_json_atomically
+
+
+class TestedState(object):
+    """
+    This class remembers, from one CI run to the other, which release was last
+    tested for each board/tree/branch/defconfig/test combination, so that
+    unchanged combinations can be skipped.
+
+    The state is kept in memory, and written back to the JSON file at `path`
+    by the `save` method, atomically, so that a crash never leaves a partial
+    file behind.
+    """
+
+    def __init__(self, path):
+        self._path = path
+        self._lock = threading.Lock()
+        try:
+            with open(path) as f:
+                self._state = json.load(f)
+        except FileNotFoundError:
+            self._state = {}
+
+    def __get_key(self, board, tree, branch, defconfig, test):
+        return '--'.join([board, tree, branch, defconfig, test])
+
+    def is_new(self, board, tree, branch, defconfig, test, release):
+        """
+        Returns whether `release` was not the last one tested for the given
+        combination.
+        """
+        key = self.__get_key(board, tree, branch, defconfig, test)
+        with self._lock:
+            entry = self._state.get(key)
+        return entry is None or entry['release'] != release
+
+    def record(self, board, tree, branch, defconfig, test, release):
+        """
+        Records that `release` was tested on the given combination.
+        """
+        key = self.__get_key(board, tree, branch, defconfig, test)
+        with self._lock:
+            self._state[key] = {
+                'release': release,
+                'tested_on': time.time(),
+            }
+
+    def save(self):
+        with self._lock:
+            write_json_atomically(self._path, self._state, '.tested-')
+
+
+class RunJournal(object):
+    """
+    This class journals the jobs sent by a CI run, so that a run that died
+    halfway can be resumed without sending its jobs again.
+
+    Each job is appended to the JSON lines file at `path`, and synced to disk,
+    as soon as it is sent. A line cut short by a crash is ignored when the
+    journal is read back.
+
+    `resume`: whether to read back the journal left by the previous run. If
+    not, or if that run finished, it is started over. The `resumed` attribute
+    tells whether it was read back.
+    """
+
+    def __init__(self, path, resume=False):
+        self._path = path
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self.started_on = time.time()
+        complete = True
+
+        if resume:
+            try:
+                with open(path) as f:
+                    for line in f:
+                        complete = line.endswith('\n')
+                        try:
+                            entry = json.loads(line)
+                        except ValueError:
+                            continue
+                        if 'started_on' in entry:
+                            self.started_on = entry['started_on']
+                        elif 'finished_on' in entry:
+                            resume = False
+                        elif 'job_name' in entry:
+                            self._entries[entry['job_name']] = entry
+            except FileNotFoundError:
+                resume = False
+
+            if not resume:
+                self._entries.clear()
+                self.started_on = time.time()
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.resumed = resume
+        self._file = open(path, 'a' if resume else 'w')
+        if not resume:
+            self.__append({'started_on': self.started_on})
+        elif not complete:
+            # Don't append to the line cut short
+            self._file.write('\n')
+
+    def __append(self, entry):
+        self._file.write(json.dumps(entry, sort_keys=True) + '\n')
+        self._file.flush()
+        os.fsync(self._file.fileno())
+
+    def is_done(self, job_name):
+        with self._lock:
+            return job_name in self._entries
+
+    def entries(self):
+        """
+        Returns the list of the jobs journaled, in the order they were sent.
+        Each one is a dict of the fields of its `JobSpec`, and its `release`.
+        """
+        with self._lock:
+            return list(self._entries.values())
+
+    def record(self, spec, release):
+        """
+        Journals that the job described by the `JobSpec` `spec` was sent, with
+        the kernel `release`.
+        """
+        entry = dict(spec._asdict())
+        entry['release'] = release
+        with self._lock:
+            self._entries[spec.job_name] = entry
+            self.__append(entry)
+
+    def finish(self):
+        """
+        Journals that the run finished, so that it isn't resumed.
+        """
+        with self._lock:
+            self.__append({'finished_on': time.time()})
+
+    def close(self):
+        with self._lock:
+            self._file.close()
@@ -28,8 +28,8 @@ class BaseCmdline(object):
         raise NotImplementedError("Missing parsing function")
 
     def _validate_cmdline(self):
-        # We can always just list the boards
-        if self._cmdline['list']:
+        # We can always just list the boards, or send the jobs already made
+        if self._cmdline['list'] or self._cmdline['flush']:
             return
 
         # Validate that we have all the basic options
@@ -77,11 +77,62 @@ class CICmdline(BaseCmdline):
                             help='Board to run the test on')
         parser.add_argument('-l', '--list', action='store_true',
                             help='List all the available boards')
+        parser.add_argument('--flush', action='store_true',
+                            help='Only send the jobs that previous runs '
+                            'couldn\'t send')
         parser.add_argument('-d', '--debug', action='store_true',
                             help='Debug mode')
+        parser.add_argument('--shard', metavar='INDEX/COUNT',
+                            help='Only handle the INDEXth part (starting at '
+                            '1) of the jobs split in COUNT parts')
+        parser.add_argument('--plan', action='store_true',
+                            help='Only print the jobs that would be made, as '
+                            'JSON')
+        parser.add_argument('--no-cache', action='store_true',
+                            help='Don\'t use nor update the data kept from '
+                            'previous runs')
+        parser.add_argument('--only-new', action='store_true',
+                            help='Only send the jobs whose kernel release '
+                            'changed since they were last sent')
+        parser.add_argument('--force', action='store_true',
+                            help='Send the jobs even if their release was '
+                            'already tested, with --only-new')
+        parser.add_argument('--no-dedup', action='store_true',
+                            help='Send the jobs identical to another one '
+                            'anyway')
+        parser.add_argument('--resume', action='store_true',
+                            help='Only send the jobs that the previous run '
+                            'did not send, if it did not complete')
+        parser.add_argument('--race-crawlers', action='store_true',
+                            help='Look for artifacts on all the sources at '
+                            'the same time, instead of one after the other')
+
+        workers = parser.add_argument_group('Parallelism')
+        workers.add_argument('-j', '--workers', type=int, default=1,
+                             help='Number of boards handled at the same time')
+        workers.add_argument('--crawl-workers', type=int, default=4,
+                             help='Maximum number of artifacts lookups at the '
+                             'same time')
+        workers.add_argument('--submit-workers', type=int, default=1,
+                             help='Number of threads sending the jobs, '
+                             'while the next ones are being made')
 
         self._cmdline = vars(parser.parse_args())
 
+    def _validate_cmdline(self):
+        super(CICmdline, self)._validate_cmdline()
+        if 'shard' in self:
+            try:
+                index, count = [int(i) for i in
+                                self._cmdline['shard'].split('/')]
+            except ValueError:
+                raise OptionError('Invalid shard %s, expected INDEX/COUNT' %
+                                  self._cmdline['shard'])
+            if not 1 <= index <= count:
+                raise OptionError('Invalid shard %s, INDEX must be between 1 '
+                                  'and COUNT' % self._cmdline['shard'])
+            self._cmdline['shard'] = (index, count)
+
 class CTTCmdline(BaseCmdline):
     _MANDATORY_KEYS = [
             'boards',
@@ -99,6 +150,9 @@ class CTTCmdline(BaseCmdline):
                             help='Board to run the test on')
         parser.add_argument('-l', '--list', action='store_true',
                             help='List all the available boards')
+        parser.add_argument('--flush', action='store_true',
+                            help='Only send the jobs that previous runs '
+                            'couldn\'t send')
 
         job = parser.add_argument_group('Job handling')
         job.add_argument('--output-dir', default='jobs',
@@ -1,22 +1,44 @@
 import os
+import hashlib
 import logging
 import json
+import threading
+from collections import namedtuple
+from types import MappingProxyType
 
-from jinja2 import FileSystemLoader, Environment
+from jinja2 import FileSystemBytecodeCache, FileSystemLoader, Environment
 
+from src.Config import get_cache_dir
+from src.job_schema import InvalidJobError, validate
 
 from src.crawlers import FreeElectronsCrawler, KernelCICrawler
 from src.crawlers import RemoteAccessError
 from src.writers import FileWriter, LavaWriter, UnavailableError
 
 
+class CraftingError(Exception):
+    pass
+
+
+# A job rendered by `JobCrafter.render_many`: the (board name, artifacts, test,
+# job name) `spec` it was made from, the `board` structure and job `name` to
+# give to the writers, and the `job` definition itself.
+RenderedJob = namedtuple('RenderedJob', ['spec', 'board', 'name', 'job'])
+
+
 class JobCrafter(object):
     """
     This class handle the jobs.
+
+    Rendering a job doesn't change the state of the crafter, so that several
+    threads can share it to render jobs at the same time.
     """
     __TEMPLATE_FOLDER = "jobs_templates"
 
-    def __init__(self, boards, cfg):
+    # Number of validation results kept
+    _VALIDATION_CACHE_SIZE = 4096
+
+    def __init__(self, boards, cfg, outbox=None):
         """
         `boards`: dict
             This is the dictionary structure found in the boards.json file.
@@ -31,6 +53,10 @@ class JobCrafter(object):
                 - notify
                 - lava_server (for LAVA v1 templates)
                 - lava_stream (for LAVA v1 templates)
+                - cache_dir (where the compiled templates are kept)
+                - no_cache (to not keep them)
+        `outbox`: Outbox
+            Where to keep the jobs that couldn't be sent, if any.
 
         TODO: make some check at init time
         """
@@ -38,32 +64,170 @@ class JobCrafter(object):
         self._cfg = cfg
         with open(os.path.join(os.path.dirname(os.path.dirname(__file__)), "tests.json")) as f:
             self._tests = json.load(f)
-        self.job = {
-                "timeout": 0,
-                "kernel": "",
-                "device_tree": "",
-                "rootfs": "",
-                "rootfs_type": "",
-                "modules": "",
-                "test": "",
-                "lava_server": "",
-                "lava_stream": "",
-                "device_type": "",
-                "job_name": "",
-                "notify": [],
-                }
-        self.jinja_env = Environment(loader=FileSystemLoader(os.path.dirname(__file__)))
+        self.jinja_env = Environment(
+                loader=FileSystemLoader(os.path.dirname(__file__)),
+                bytecode_cache=self.__get_bytecode_cache())
+        # Compile all the templates once and for all
+        self._validated = {}
+        self._lock = threading.Lock()
+        self._templates = {}
+        for t in sorted(set(t['template'] for t in self._tests.values())):
+            path = os.path.join(JobCrafter.__TEMPLATE_FOLDER, t)
+            self._templates[path] = self.jinja_env.get_template(path)
         if self._cfg['no_send']:
             self.writer = FileWriter(self._cfg)
         else:
-            self.writer = LavaWriter(self._cfg)
+            self.writer = LavaWriter(self._cfg, outbox)
 
 # Template handling
+    def __get_bytecode_cache(self):
+        """
+        Returns a cache keeping the compiled templates on disk from one run to
+        the other, or None if disabled or unavailable.
+        """
+        if 'no_cache' in self._cfg and self._cfg['no_cache']:
+            return None
+
+        directory = os.path.join(get_cache_dir(self._cfg), 'jinja')
+        try:
+            os.makedirs(directory, exist_ok=True)
+        except OSError as e:
+            logging.warning("Not caching the compiled templates: %s" % e)
+            return None
+
+        return FileSystemBytecodeCache(directory)
+
     def get_template_from_file(self, file):
         logging.debug("    Template: %s" % file)
-        self.job_template = self.jinja_env.get_template(file)
+        if file in self._templates:
+            return self._templates[file]
+
+        return self.jinja_env.get_template(file)
 
 # Job handling
+    def make_context(self, board_name, artifacts, test,
+                     job_name="default_job_name"):
+        """
+        Returns the read-only dict of the variables to render the template of
+        a job with. It is made from scratch for each job, so that nothing
+        leaks from one job to the other.
+
+        See `make_jobs` for the arguments.
+        This raises a CraftingError if the job can't be made.
+        """
+        if test not in self._tests:
+            raise CraftingError("Test %s does not exists" % test)
+
+        # Get easier access to board config
+        board_config = self._boards[board_name]
+
+        # rootfs type
+        if board_config["test_plan"] == "boot":
+            rootfs_type = "ramdisk"
+        elif board_config["test_plan"] == "boot-nfs":
+            rootfs_type = "nfsrootfs"
+        else:
+            raise CraftingError("Invalid test_plan for board %s" %
+                                board_config["name"])
+
+        if 'timeout' in self._cfg: # Give priority to the command line
+            timeout = self._cfg['timeout']
+        else:
+            timeout = self._tests[test]['timeout']
+
+        return MappingProxyType({
+            "timeout": timeout,
+            "kernel": artifacts['kernel'],
+            "device_tree": artifacts['dtb'],
+            "rootfs": artifacts['rootfs'],
+            "rootfs_type": rootfs_type,
+            # modules are optional if we have our own kernel
+            "modules": artifacts.get('modules', ""),
+            "test": test,
+            "lava_server": self._cfg['server'] if 'server' in self._cfg else "",
+            "lava_stream": self._cfg['stream'] if 'stream' in self._cfg else "",
+            "device_type": board_config['device_type'],
+            "job_name": "%s--%s" % (job_name, test),
+            "notify": tuple(self._cfg['notify'])
+                      if 'notify' in self._cfg else (),
+        })
+
+    def __validate(self, path, context, job):
+        """
+        Raises a CraftingError if `job`, rendered from the `path` template and
+        `context`, isn't a valid LAVA job. The result is cached by template
+        and context, since the same ones always render the same job.
+        The job name, unique to each job, is left out of the key, so that the
+        jobs only differing by their name are checked once.
+        """
+        context = dict(context)
+        job_name = context.pop('job_name')
+        key = hashlib.sha1(json.dumps([path, context], sort_keys=True,
+                                      default=str).encode('utf-8')).digest()
+        with self._lock:
+            error = self._validated.get(key, False)
+
+        if error is False:
+            try:
+                validate(job)
+                error = None
+            except InvalidJobError as e:
+                error = str(e)
+
+            with self._lock:
+                if len(self._validated) >= self._VALIDATION_CACHE_SIZE:
+                    self._validated.clear()
+                self._validated[key] = error
+
+        if error is not None:
+            raise CraftingError("Invalid job %s: %s" % (job_name, error))
+
+    def __render(self, context):
+        path = os.path.join(JobCrafter.__TEMPLATE_FOLDER,
+                            self._tests[context['test']]['template'])
+        job = self.get_template_from_file(path).render(context)
+        self.__validate(path, context, job)
+        return job
+
+    def render(self, board_name, artifacts, test, job_name="default_job_name"):
+        """
+        Returns the definition of a job, as a YAML string.
+
+        See `make_jobs` for the arguments.
+        This raises a CraftingError if the job can't be made.
+        """
+        return self.__render(self.make_context(board_name, artifacts, test,
+                                               job_name))
+
+    def render_many(self, specs):
+        """
+        Renders the jobs described by the (board name, artifacts, test, job
+        name) tuples of the `specs` iterable, and yields a `RenderedJob` for
+        each one, in the same order.
+
+        The specs are consumed one at a time, as the jobs are asked for, so
+        that any number of jobs can be rendered in constant memory.
+        The jobs that can't be made are logged and left out.
+        """
+        tests = frozenset(self._tests)
+        unknown = set()
+        for spec in specs:
+            board_name, artifacts, test, job_name = spec
+            if test not in tests:
+                # Only complain once per test
+                if test not in unknown:
+                    logging.warning("  Test %s does not exists" % test)
+                    unknown.add(test)
+                continue
+
+            try:
+                job = self.render(board_name, artifacts, test, job_name)
+            except CraftingError as e:
+                logging.warning("  %s" % e)
+                continue
+
+            yield RenderedJob(spec, self._boards[board_name], job_name, job)
+
     def make_jobs(self, board_name, artifacts, test, job_name="default_job_name"):
         """
         The main method building up the jobs.
@@ -83,72 +247,41 @@ class JobCrafter(object):
             the keys in tests.json
         `job_name`: string
             A name to give to the job.
-        """
-        # Verify that the test exists
-        if test not in self._tests.keys():
-            logging.warning("  Test %s does not exists" % test)
-            return
-
-        # Get easier access to board config
-        board_config = self._boards[board_name]
-
-        if 'server' in self._cfg:
-            self.job["lava_server"] = self._cfg['server']
-
-        if 'stream' in self._cfg:
-            self.job["lava_stream"] = self._cfg['stream']
-
-        if 'notify' in self._cfg:
-            self.job["notify"] = self._cfg['notify']
 
-        logging.info("    Notifications recipients: %s" % ", ".join(self.job['notify']))
-
-        # rootfs type
-        if board_config["test_plan"] == "boot":
-            self.job["rootfs_type"] = "ramdisk"
-        elif board_config["test_plan"] == "boot-nfs":
-            self.job["rootfs_type"] = "nfsrootfs"
-        else:
-            raise Exception(red("Invalid test_plan for board %s" %
-                    board_config["name"]))
-
-        self.job["device_type"] = board_config['device_type']
-
-        self.job['rootfs'] = artifacts['rootfs']
-        logging.info("    Root filesystem path: %s" % self.job['rootfs'])
-
-        self.job['kernel'] = artifacts['kernel']
-        logging.info("    Kernel path: %s" % self.job['kernel'])
-
-        self.job['device_tree'] = artifacts['dtb']
-        logging.info("    Device tree path: %s" % self.job['device_tree'])
-
-        # modules are optional if we have our own kernel
-        if 'modules' in artifacts:
-            self.job['modules'] = artifacts['modules']
-            logging.info('    Modules archive path: %s' % self.job['modules'])
-
-        self.get_template_from_file(os.path.join(JobCrafter.__TEMPLATE_FOLDER,
-            self._tests[test]['template']))
-
-        if 'timeout' in self._cfg: # Give priority to the command line
-            self.job["timeout"] = self._cfg['timeout']
-        else:
-            self.job["timeout"] = self._tests[test]['timeout']
+        It returns the list of the locations the job was saved to, or None if
+        it couldn't be made or saved.
+        """
+        try:
+            context = self.make_context(board_name, artifacts, test, job_name)
+        except CraftingError as e:
+            logging.warning("  %s" % e)
+            return None
 
-        self.job["test"] = test
+        logging.info("    Notifications recipients: %s" %
+                     ", ".join(context['notify']))
+        logging.info("    Root filesystem path: %s" % context['rootfs'])
+        logging.info("    Kernel path: %s" % context['kernel'])
+        logging.info("    Device tree path: %s" % context['device_tree'])
+        if context['modules']:
+            logging.info('    Modules archive path: %s' % context['modules'])
+        logging.debug("    Job name: %s" % context['job_name'])
 
-        self.job["job_name"] = "%s--%s" % (
-                job_name,
-                test
-                )
-        logging.debug("    Job name: %s" % self.job['job_name'])
+        try:
+            job = self.__render(context)
+        except CraftingError as e:
+            logging.warning("  %s" % e)
+            return None
 
         try:
-            out = self.writer.write(board_config, job_name,
-                                    self.job_template.render(self.job))
+            out = self.writer.write(self._boards[board_name], job_name, job)
+            self.writer.unspool(job_name)
             for output in out:
                 logging.info("  ==> Job saved to: %s" % output)
+            return out
         except UnavailableError as e:
             logging.warning("  ==> Unable to send job: %s" % e)
-
+            self.writer.spool(RenderedJob((board_name, artifacts, test,
+                                           job_name),
+                                          self._boards[board_name], job_name,
+                                          job))
+            return None
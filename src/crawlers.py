@@ -1,8 +1,17 @@
 import logging
+import posixpath
 import requests
+import threading
 
 import time
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
+from html.parser import HTMLParser
+from urllib.parse import unquote
+
+from src.http_client import ArtifactInfo, HTTPClient
+from src.memo import Memoizer
+from src.release_cache import ReleaseCache
 
 
 class BaseError(Exception):
@@ -21,20 +30,78 @@ class RemoteAccessError(BaseError):
     pass
 
 
+class _ListingParser(HTMLParser):
+    """
+    This parser collects the entries of an HTML directory index, as generated
+    by the usual web servers: the relative links of the page. Directories end
+    with a slash.
+    """
+
+    def __init__(self):
+        super(_ListingParser, self).__init__()
+        self.entries = set()
+
+    def handle_starttag(self, tag, attrs):
+        if tag != 'a':
+            return
+
+        href = dict(attrs).get('href')
+        if not href:
+            return
+
+        # Skip the sorting links, the parent directory, and anything absolute
+        href = unquote(href.split('?')[0].split('#')[0])
+        if not href or href.startswith(('/', '.')) or '://' in href:
+            return
+
+        self.entries.add(href)
+
+
 class CTTCrawler(object):
     """
     This is the base Crawler class. A crawler is an object able to fetch
     artifacts from remote location, given a board, and the tree/branch/defconfig
     combination.
     """
+    # Whether the remote serves directory indexes we can rely on
+    _LISTING_SUPPORTED = False
 
-    def __init__(self, cfg):
+    def __init__(self, cfg, release_cache=None, http=None, index=None):
         """
         `cfg` is any object behaving like a dictionary, and containing at least
         the `api_token`
         TODO: move me to the KernelCICrawler, since it's used only there.
+
+        `release_cache` is a `ReleaseCache` shared by all the crawlers of a
+        launch. If not given, the crawler uses its own.
+
+        `http` is the `HTTPClient` to send the requests with. If not given, the
+        crawler uses its own.
+
+        `index` is an optional `ArtifactIndex` to remember the artifacts
+        from one run to the other.
+
+        If `cfg` contains the `crawl_concurrency` key, up to that many
+        artifacts are probed at the same time by each crawl.
+
+        If the `crawl_mode` key of `cfg` is `listing`, and the crawler
+        supports it, the artifacts are looked for in the directory indexes of
+        the builds, which are fetched only once per directory, instead of
+        being probed one by one. The default mode is `probe`.
         """
         self._cfg = cfg
+        if 'crawl_concurrency' in cfg:
+            self._concurrency = int(cfg['crawl_concurrency'])
+        else:
+            self._concurrency = 1
+        self._use_listing = (self._LISTING_SUPPORTED and
+                             'crawl_mode' in cfg and
+                             cfg['crawl_mode'] == 'listing')
+        self._listings = Memoizer()
+        self._release_cache = release_cache or ReleaseCache()
+        self._http = http or HTTPClient()
+        self._index = index
+        self._artifacts_info = {}
 
     def __get_image_name(self, board):
         if board['arch'] == 'arm':
@@ -44,9 +111,135 @@ class CTTCrawler(object):
 
         raise InvalidParameterError('Unknown architecture')
 
+    def _probe(self, url, error):
+        """
+        Checks that `url` exists without downloading it, and records its size
+        and modification date.
+        `error` is the message of the `RemoteEmptyError` raised when it does
+        not.
+        """
+        try:
+            if self._index:
+                info = self._index.probe(self._http, url)
+            else:
+                info = self._http.probe(url)
+        except requests.exceptions.HTTPError:
+            raise RemoteEmptyError(error)
+        except (requests.exceptions.ConnectionError,
+                requests.exceptions.Timeout):
+            raise RemoteAccessError('Remote host not accessible')
+
+        self._artifacts_info[url] = info
+        return info
+
+    def _probe_all(self, probes):
+        """
+        Probes all the (url, error) couples of the `probes` list.
+
+        The probes are run in parallel when the `crawl_concurrency` key of the
+        configuration is greater than one, but the error raised is always the
+        one of the first failing probe in the list, like when they are run one
+        after the other.
+        """
+        if self._concurrency <= 1 or len(probes) <= 1:
+            for url, error in probes:
+                self._probe(url, error)
+            return
+
+        with ThreadPoolExecutor(min(self._concurrency, len(probes))) as pool:
+            futures = [pool.submit(self._probe, url, error)
+                       for url, error in probes]
+            for future in futures:
+                future.result()
+
+    def __fetch_listing(self, url):
+        try:
+            r = self._http.get('%s/' % url)
+            r.raise_for_status()
+        except requests.exceptions.HTTPError as e:
+            if e.response is not None and e.response.status_code == 404:
+                return None
+            raise
+
+        parser = _ListingParser()
+        parser.feed(r.text)
+        return frozenset(parser.entries)
+
+    def _list_dir(self, url):
+        """
+        Returns the set of the entries of the directory at `url`, directories
+        ending with a slash, or None if there is no such directory.
+        Each directory is fetched only once.
+        """
+        return self._listings.get(url, lambda: self.__fetch_listing(url))
+
+    def _find(self, base, url, error):
+        """
+        Checks that `url`, which is either `base` or a file below it, appears
+        in the directory listings, and records it.
+        `error` is the message of the `RemoteEmptyError` raised when it does
+        not.
+        """
+        directory, name = posixpath.split(url[len(base):].strip('/'))
+        try:
+            entries = self._list_dir(posixpath.join(base, directory)
+                                     if directory else base)
+        except requests.exceptions.HTTPError:
+            raise RemoteEmptyError(error)
+        except (requests.exceptions.ConnectionError,
+                requests.exceptions.Timeout):
+            raise RemoteAccessError('Remote host not accessible')
+
+        if entries is None or (name and name not in entries):
+            raise RemoteEmptyError(error)
+
+        self._artifacts_info[url] = ArtifactInfo(url, None, None, None)
+
+    def _find_all(self, base, probes):
+        """
+        Like `_probe_all`, but using the directory listings below `base`.
+        """
+        for url, error in probes:
+            self._find(base, url, error)
+
+    def __check_all(self, base, probes):
+        if self._use_listing:
+            self._find_all(base, probes)
+        else:
+            self._probe_all(probes)
+
+    def get_artifact_info(self, url):
+        """
+        Returns the `ArtifactInfo` (size, Last-Modified, ETag) recorded when
+        `url` was last found by `crawl`, or None if it never was.
+        """
+        return self._artifacts_info.get(url)
+
+    def _get_release(self, tree, branch):
+        """
+        Returns the latest release of `tree`/`branch`, going through the
+        release cache.
+        """
+        return self._release_cache.get(
+            self._get_release_key(tree, branch),
+            lambda: self._get_latest_release(tree, branch))
+
+    def _get_release_key(self, tree, branch):
+        return (self.__class__.__name__, tree, branch)
+
     def _get_latest_release(self, tree, branch):
         raise NotImplementedError('Missing release retrieval function')
 
+    def prefetch_releases(self, branches):
+        """
+        Resolves in advance the latest releases of `branches`, an iterable of
+        (tree, branch) couples, when the crawler can do it more efficiently
+        than one by one.
+        This is only an optimization: the releases it couldn't resolve are
+        still looked for when needed.
+        """
+        pass
+
     def _get_base_url(self, tree, branch, arch, defconfig):
         raise NotImplementedError('Missing base URL retrieval function')
 
@@ -75,49 +268,30 @@ class CTTCrawler(object):
                       (self.__class__.__name__, board['name'], defconfig))
 
         url = self._get_base_url(tree, branch, board['arch'], defconfig)
-        try:
-            r = requests.get(url)
-            r.raise_for_status()
-        except requests.exceptions.HTTPError:
-            raise RemoteEmptyError(
-                'Defconfig build not available for this version')
-        except requests.exceptions.ConnectionError:
-            raise RemoteAccessError('Remote host not accessible')
+        probes = [(url, 'Defconfig build not available for this version')]
 
-        kernel = '%s/%s' % (url, self.__get_image_name(board))
         try:
-            r = requests.get(kernel)
-            r.raise_for_status()
-        except requests.exceptions.HTTPError:
-            raise RemoteEmptyError(
-                'Kernel image not available for this version')
-        except requests.exceptions.ConnectionError:
-            raise RemoteAccessError('Remote host not accessible')
+            kernel = '%s/%s' % (url, self.__get_image_name(board))
+        except InvalidParameterError:
+            # A missing build still takes precedence
+            self.__check_all(url, probes)
+            raise
+        probes.append((kernel, 'Kernel image not available for this version'))
 
         modules = '%s/%s' % (url, 'modules.tar.xz')
-        try:
-            r = requests.get(modules)
-            r.raise_for_status()
-        except requests.exceptions.HTTPError:
-            raise RemoteEmptyError(
-                'modules tarball not available for this version')
-        except requests.exceptions.ConnectionError:
-            raise RemoteAccessError('Remote host not accessible')
+        probes.append((modules,
+                       'modules tarball not available for this version'))
 
         dtb = '%s/dtbs/%s.dtb' % (url, board['dt'])
-        try:
-            r = requests.get(dtb)
-            r.raise_for_status()
-        except requests.exceptions.HTTPError:
-            raise RemoteEmptyError(
-                'Device Tree not available for this version')
-        except requests.exceptions.ConnectionError:
-            raise RemoteAccessError('Remote host not accessible')
+        probes.append((dtb, 'Device Tree not available for this version'))
+
+        self.__check_all(url, probes)
 
         return {
             'dtb': dtb,
             'kernel': kernel,
             'modules': modules,
+            'release': self._get_release(tree, branch),
         }
 
 
@@ -125,24 +299,26 @@ class FreeElectronsCrawler(CTTCrawler):
     """
     A Free Electrons specific crawler.
     """
+    _LISTING_SUPPORTED = True
     __BASE_URL = 'http://lava.bootlin.com/downloads/builds/'
 
     def _get_base_url(self, tree, branch, arch, defconfig):
         return '%s/%s/%s/%s/%s/%s' % (self.__BASE_URL, tree, branch,
-                                      self._get_latest_release(tree, branch),
+                                      self._get_release(tree, branch),
                                       arch, defconfig)
 
     def _get_latest_release(self, tree, branch):
         url = '%s/%s/%s/latest' % (self.__BASE_URL, tree, branch)
         try:
-            r = requests.get(url)
+            r = self._http.get(url)
             r.raise_for_status()
             current_time = datetime.utcfromtimestamp(time.time())
             build_time = datetime.strptime(r.headers['Last-Modified'],
                     "%a, %d %b %Y %H:%M:%S GMT")
         except requests.exceptions.HTTPError:
             raise RemoteEmptyError('Release page not accessible')
-        except requests.exceptions.ConnectionError:
+        except (requests.exceptions.ConnectionError,
+                requests.exceptions.Timeout):
             raise RemoteAccessError('Remote host not accessible')
 
         return r.text
@@ -155,20 +331,26 @@ class KernelCICrawler(CTTCrawler):
     __BASE_URL = 'https://storage.kernelci.org/'
     __RELEASE_URL = 'https://api.kernelci.org/build?'\
             'limit=1&job=%s&field=kernel&field=created_on&sort=created_on&git_branch=%s'
+    __BUILDS_URL = 'https://api.kernelci.org/build'
+    # Builds returned per request, and maximum number of requests per tree
+    # when prefetching the releases
+    _PREFETCH_PAGE_SIZE = 200
+    _PREFETCH_MAX_PAGES = 5
 
     def _get_base_url(self, tree, branch, arch, defconfig):
         return '%s/%s/%s/%s/%s/%s' % (self.__BASE_URL, tree, branch,
-                                      self._get_latest_release(tree, branch),
+                                      self._get_release(tree, branch),
                                       arch, defconfig)
 
     def _get_latest_release(self, tree, branch):
         try:
-            r = requests.get(self.__RELEASE_URL % (tree, branch),
+            r = self._http.get(self.__RELEASE_URL % (tree, branch),
                              headers={'Authorization': self._cfg['api_token']})
             r.raise_for_status()
         except requests.exceptions.HTTPError:
             raise RemoteEmptyError('Release page not accessible')
-        except requests.exceptions.ConnectionError:
+        except (requests.exceptions.ConnectionError,
+                requests.exceptions.Timeout):
             raise RemoteAccessError('Remote host not accessible')
 
         json = r.json()
@@ -182,3 +364,189 @@ class KernelCICrawler(CTTCrawler):
 
         return json['result'][0]['kernel']
 
+    def __prefetch_tree(self, tree, branches):
+        missing = set(branches)
+        skip = 0
+        for page in range(self._PREFETCH_MAX_PAGES):
+            params = [('job', tree)]
+            params += [('git_branch', b) for b in sorted(missing)]
+            params += [('field', 'kernel'), ('field', 'git_branch'),
+                       ('field', 'created_on'), ('sort', 'created_on'),
+                       ('limit', self._PREFETCH_PAGE_SIZE),
+                       ('skip', skip)]
+            r = self._http.get(self.__BUILDS_URL, params=params,
+                               headers={'Authorization':
+                                        self._cfg['api_token']})
+            r.raise_for_status()
+            builds = r.json().get('result', [])
+
+            # Builds are sorted from the newest, so the first one seen for
+            # a branch is its latest release
+            found = False
+            for build in builds:
+                branch = build.get('git_branch')
+                if branch in missing and 'kernel' in build:
+                    self._release_cache.put(
+                        self._get_release_key(tree, branch), build['kernel'])
+                    missing.remove(branch)
+                    found = True
+
+            if not missing or len(builds) < self._PREFETCH_PAGE_SIZE:
+                break
+
+            # The next query only asks for the branches still missing, so
+            # skipping the builds seen would skip their newest ones
+            if found:
+                skip = 0
+            else:
+                skip += self._PREFETCH_PAGE_SIZE
+
+        return missing
+
+    def prefetch_releases(self, branches):
+        """
+        Asks the KernelCI API for the latest builds of all the branches of a
+        tree at once, paging through the results until every branch got its
+        release.
+        """
+        trees = {}
+        for tree, branch in branches:
+            trees.setdefault(tree, set()).add(branch)
+
+        for tree, tree_branches in sorted(trees.items()):
+            try:
+                missing = self.__prefetch_tree(tree, tree_branches)
+            except (requests.exceptions.RequestException, ValueError) as e:
+                logging.warning("Unable to prefetch the %s releases: %s" %
+                                (tree, e))
+                continue
+
+            if missing:
+                logging.debug("No recent release found for %s: %s" %
+                              (tree, ", ".join(sorted(missing))))
+
+
+
+class CrawlerChain(object):
+    """
+    This class looks for artifacts through several crawlers, ordered by
+    priority, and returns the artifacts of the highest priority crawler that
+    found them.
+
+    By default, the crawlers are queried one after the other, stopping at the
+    first one finding the artifacts. In `race` mode, they are all queried at
+    the same time, which is faster when the highest priority ones often fail,
+    at the cost of more requests.
+
+    It keeps per crawler statistics, see the `stats` method.
+    """
+
+    def __init__(self, race=False):
+        self._race = race
+        self._crawlers = []
+        self._stats = {}
+        self._lock = threading.Lock()
+
+    def add(self, crawler, priority):
+        """
+        Adds `crawler` to the chain. The lower the `priority`, the earlier the
+        crawler is queried. Crawlers with the same priority are queried in the
+        order they were added.
+        """
+        self._crawlers.append((priority, len(self._crawlers), crawler))
+        self._crawlers.sort(key=lambda c: c[:2])
+        self._stats[crawler.__class__.__name__] = {
+            'found': 0,
+            'empty': 0,
+            'unreachable': 0,
+            'served': 0,
+        }
+
+    def __crawl_one(self, crawler, board, tree, branch, defconfig):
+        """
+        Returns a (artifacts, error) couple, one of them being None.
+        """
+        try:
+            return crawler.crawl(board, tree, branch, defconfig), None
+        except (RemoteEmptyError, RemoteAccessError) as e:
+            return None, e
+
+    def __record(self, crawler, error, log=True):
+        name = crawler.__class__.__name__
+        if isinstance(error, RemoteEmptyError):
+            if log:
+                logging.debug("  No artifacts returned by crawler %s: %s" %
+                              (name, error))
+            key = 'empty'
+        elif isinstance(error, RemoteAccessError):
+            if log:
+                logging.warning("  Remote unreachable for crawler %s: %s" %
+                                (name, error))
+            key = 'unreachable'
+        else:
+            key = 'found'
+
+        with self._lock:
+            self._stats[name][key] += 1
+
+    def __serve(self, crawler, artifacts):
+        with self._lock:
+            self._stats[crawler.__class__.__name__]['served'] += 1
+        return artifacts
+
+    def crawl(self, board, tree, branch, defconfig):
+        """
+        Takes the same arguments and returns the same dictionary as
+        `CTTCrawler.crawl`.
+        It raises a RemoteEmptyError if no crawler found the artifacts.
+        """
+        crawlers = [c[2] for c in self._crawlers]
+
+        if not self._race or len(crawlers) <= 1:
+            for crawler in crawlers:
+                artifacts, error = self.__crawl_one(crawler, board, tree,
+                                                    branch, defconfig)
+                self.__record(crawler, error)
+                if artifacts:
+                    return self.__serve(crawler, artifacts)
+
+            raise RemoteEmptyError('No artifacts found')
+
+        pool = ThreadPoolExecutor(len(crawlers))
+        futures = [pool.submit(self.__crawl_one, crawler, board, tree, branch,
+                               defconfig)
+                   for crawler in crawlers]
+        pool.shutdown(wait=False)
+
+        # Results are handled by priority, and the lower priority crawlers are
+        # not waited for once we have an answer: their outcome only goes to
+        # the statistics.
+        for i, (crawler, future) in enumerate(zip(crawlers, futures)):
+            artifacts, error = future.result()
+            self.__record(crawler, error)
+            if artifacts:
+                for c, f in zip(crawlers[i + 1:], futures[i + 1:]):
+                    f.add_done_callback(
+                        lambda f, c=c: self.__record(c, f.result()[1],
+                                                     log=False))
+                return self.__serve(crawler, artifacts)
+
+        raise RemoteEmptyError('No artifacts found')
+
+    def prefetch_releases(self, branches):
+        """
+        Calls `prefetch_releases` on all the crawlers of the chain.
+        """
+        branches = list(branches)
+        for c in self._crawlers:
+            c[2].prefetch_releases(branches)
+
+    def stats(self):
+        """
+        Returns a dict giving, for each crawler class name, a dict with the
+        number of crawls that `found` the artifacts, that came back `empty`,
+        that could not reach the remote (`unreachable`), and the number of
+        crawls that actually `served` the artifacts returned by the chain.
+        """
+        with self._lock:
+            return dict((k, dict(v)) for k, v in self._stats.items())
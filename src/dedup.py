@@ -0,0 +1,144 @@
+import hashlib
+import json
+import logging
+import threading
+import time
+
+from src.fileutils import write_json_atomically
+from src.job_schema import InvalidJobError, load
+
+
+# Fields that differ between jobs doing the very same thing
+DEFAULT_IGNORED_FIELDS = ('job_name',)
+
+
+def get_job_hash(job, ignored_fields=DEFAULT_IGNORED_FIELDS):
+    """
+    Returns a hash of the content of the `job` YAML definition, which doesn't
+    depend on its formatting, the order of its keys, or the value of its
+    `ignored_fields` top-level keys.
+    A job that isn't valid YAML is hashed as is.
+    """
+    try:
+        data = load(job)
+    except InvalidJobError:
+        data = None
+
+    if isinstance(data, dict):
+        data = dict((k, v) for k, v in data.items()
+                    if k not in ignored_fields)
+        content = json.dumps(data, sort_keys=True, separators=(',', ':'),
+                             default=str)
+    else:
+        content = job
+
+    return hashlib.sha256(content.encode('utf-8')).hexdigest()
+
+
+class JobDeduplicator(object):
+    """
+    This class drops the jobs doing exactly the same thing as another one,
+    so that they don't take a device for nothing.
+
+    A job is dropped if a job with the same content, according to
+    `get_job_hash`, was already let through during the run, unless that one
+    was then discarded because it couldn't be sent, or, when `window` is
+    given, if one was sent less than `window` seconds ago.
+    The jobs sent are remembered from one run to the other in the JSON file at
+    `path`, written back by the `save` method.
+
+    `ignored_fields`: the top-level fields of the jobs to ignore when
+    comparing them.
+    """
+
+    def __init__(self, ignored_fields=DEFAULT_IGNORED_FIELDS, window=None,
+                 path=None):
+        self._ignored_fields = tuple(ignored_fields)
+        self._window = window
+        self._path = path
+        self._lock = threading.Lock()
+        self._seen = {}
+        self._hashes = {}
+        self._dropped = []
+        self._sent = {}
+
+        if path is not None and window is not None:
+            try:
+                with open(path) as f:
+                    self._sent = json.load(f)
+            except FileNotFoundError:
+                pass
+
+    def filter(self, jobs):
+        """
+        Yields the `RenderedJob` of the `jobs` iterable that aren't
+        duplicates, in the same order.
+        """
+        for job in jobs:
+            job_hash = get_job_hash(job.job, self._ignored_fields)
+            with self._lock:
+                reason = None
+                sent = self._sent.get(job_hash)
+                if job_hash in self._seen:
+                    reason = "same as %s" % self._seen[job_hash]
+                elif (self._window is not None and sent is not None and
+                        time.time() - sent['sent_on'] < self._window):
+                    reason = "same as %s, sent on %s" % (
+                            sent['name'], time.ctime(sent['sent_on']))
+                else:
+                    self._seen[job_hash] = job.name
+                    self._hashes[job.name] = job_hash
+
+                if reason is not None:
+                    self._dropped.append((job.name, reason))
+
+            if reason is not None:
+                logging.info("  Not sending %s: %s" % (job.name, reason))
+                continue
+
+            yield job
+
+    def record(self, job):
+        """
+        Records that the `RenderedJob` `job` was sent, even if it didn't go
+        through `filter`.
+        """
+        with self._lock:
+            job_hash = self._hashes.pop(job.name, None)
+        if job_hash is None:
+            job_hash = get_job_hash(job.job, self._ignored_fields)
+
+        with self._lock:
+            self._sent[job_hash] = {
+                'name': job.name,
+                'sent_on': time.time(),
+            }
+
+    def discard(self, job):
+        """
+        Records that the `RenderedJob` `job` couldn't be sent, so that the
+        next jobs doing the same thing are let through again.
+        """
+        with self._lock:
+            job_hash = self._hashes.pop(job.name, None)
+            if job_hash is not None and self._seen.get(job_hash) == job.name:
+                del self._seen[job_hash]
+
+    def get_dropped(self):
+        """
+        Returns the list of the (job name, reason) couples of the jobs dropped
+        so far.
+        """
+        with self._lock:
+            return list(self._dropped)
+
+    def save(self):
+        if self._path is None or self._window is None:
+            return
+
+        with self._lock:
+            # Forget about the jobs that can't be matched anymore
+            now = time.time()
+            sent = dict((h, s) for h, s in self._sent.items()
+                        if now - s['sent_on'] < self._window)
+            write_json_atomically(self._path, sent, '.submitted-')
@@ -0,0 +1,135 @@
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+
+class BufferingFilter(logging.Filter):
+    """
+    This filter holds back the records logged by threads that asked for it,
+    so that they can be emitted later, all at once.
+    It has to be added to the root logger, which the records are to be handed
+    back to.
+    """
+
+    def __init__(self):
+        super(BufferingFilter, self).__init__()
+        self._local = threading.local()
+
+    def start(self):
+        self._local.records = []
+
+    def stop(self):
+        records = self._local.records
+        self._local.records = None
+        return records
+
+    def filter(self, record):
+        records = getattr(self._local, 'records', None)
+        if records is None:
+            return True
+
+        records.append(record)
+        return False
+
+
+class MatrixExecutor(object):
+    """
+    This class runs the work items of a CI sweep on a bounded pool of workers.
+
+    Each item is handled by a single call, and a failing call doesn't prevent
+    the other ones from running. The log records emitted while handling an
+    item are held back, and emitted once it is done, in the order of the
+    items, so that the output of a parallel run reads like a sequential one.
+
+    `workers`: the number of items handled at the same time. With a single
+    worker, the items are handled directly in the calling thread.
+    `stage_limits`: a dict giving the maximum number of workers allowed to be
+    in a given stage at the same time. See the `stage` method.
+    """
+
+    def __init__(self, workers=1, stage_limits=None):
+        self._workers = max(workers, 1)
+        self._stages = {}
+        self._lock = threading.Lock()
+        for name, limit in (stage_limits or {}).items():
+            self._stages[name] = threading.BoundedSemaphore(max(limit, 1))
+
+    def stage(self, name):
+        """
+        Returns a context manager to enter the `name` stage, waiting for a slot
+        if the stage is already full.
+        Stages without a configured limit are never full.
+        """
+        with self._lock:
+            if name not in self._stages:
+                self._stages[name] = threading.BoundedSemaphore(self._workers)
+            return self._stages[name]
+
+    def __call(self, func, item):
+        try:
+            return func(item)
+        except Exception as e:
+            logging.exception("  Unexpected error on %s: %s" % (item, e))
+
+    def run(self, items, func):
+        """
+        Calls `func` on each element of `items`, and returns the list of the
+        values returned, in the same order. The value is None for the calls
+        that raised an exception, which is logged.
+        """
+        if self._workers <= 1:
+            return [self.__call(func, item) for item in items]
+
+        logger = logging.getLogger()
+        log_filter = BufferingFilter()
+
+        def buffered(item):
+            log_filter.start()
+            try:
+                value = self.__call(func, item)
+            finally:
+                records = log_filter.stop()
+            return value, records
+
+        logger.addFilter(log_filter)
+        results = []
+        try:
+            with ThreadPoolExecutor(self._workers) as pool:
+                futures = [pool.submit(buffered, item) for item in items]
+                for future in futures:
+                    value, records = future.result()
+                    for record in records:
+                        logger.handle(record)
+                    results.append(value)
+        finally:
+            logger.removeFilter(log_filter)
+
+        return results
+
+
+class Progress(object):
+    """
+    This class counts the work items done out of `total`, and estimates the
+    time left from the average time per item so far.
+    """
+
+    def __init__(self, total):
+        self._total = total
+        self._done = 0
+        self._start = time.monotonic()
+        self._lock = threading.Lock()
+
+    def step(self):
+        """
+        Counts one more item done, and returns a string describing the
+        progress.
+        """
+        with self._lock:
+            self._done += 1
+            done = self._done
+
+        elapsed = time.monotonic() - self._start
+        left = int(elapsed / done * (self._total - done))
+        return "[%d/%d, ~%dm%02ds left]" % (done, self._total, left // 60,
+                                             left % 60)
@@ -0,0 +1,23 @@
+import json
+import os
+import tempfile
+
+
+def write_json_atomically(path, data, prefix):
+    """
+    Writes `data` as JSON to the file at `path`, through a temporary file
+    whose name starts with `prefix`, so that a crash never leaves a partial
+    file behind.
+    """
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+
+    fd, tmp = tempfile.mkstemp(dir=directory or '.', prefix=prefix)
+    try:
+        with os.fdopen(fd, 'w') as f:
+            json.dump(data, f, indent=2, sort_keys=True)
+        os.replace(tmp, path)
+    except BaseException:
+        os.unlink(tmp)
+        raise
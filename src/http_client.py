@@ -0,0 +1,290 @@
+import logging
+import random
+import re
+import threading
+import time
+from collections import namedtuple
+from urllib.parse import urlparse
+
+import requests
+from requests.adapters import HTTPAdapter
+
+
+# Server answers worth retrying
+TRANSIENT_CODES = (502, 503, 504)
+
+# Some servers answer HEAD with one of those instead of serving the headers,
+# in which case we fall back to a one byte ranged GET.
+HEAD_REJECTED_CODES = (405, 501)
+
+ArtifactInfo = namedtuple('ArtifactInfo',
+                          ['url', 'size', 'last_modified', 'etag'])
+
+
+class RequestBudgetError(requests.exceptions.ConnectionError):
+    """
+    Raised when a client has already sent as many requests as its budget
+    allows. It is a `ConnectionError`, so that callers handle it like an
+    unreachable host.
+    """
+    pass
+
+
+class CircuitOpenError(requests.exceptions.ConnectionError):
+    """
+    Raised, without sending anything, when a host failed too many times in a
+    row. It is a `ConnectionError`, so that callers handle it like an
+    unreachable host.
+    """
+    pass
+
+
+class HostHealth(object):
+    """
+    This class is a per host circuit breaker.
+
+    After `max_failures` consecutive failures, the circuit of a host opens, and
+    every request to it fails right away for `reset_timeout` seconds. Then, a
+    single request is let through: if it succeeds, the circuit closes again,
+    otherwise it stays open for another `reset_timeout` seconds.
+    """
+
+    def __init__(self, max_failures=5, reset_timeout=60):
+        self._max_failures = max_failures
+        self._reset_timeout = reset_timeout
+        self._hosts = {}
+        self._lock = threading.Lock()
+
+    def __get_host(self, host):
+        return self._hosts.setdefault(host, {
+            'failures': 0,
+            'opened_on': None,
+            'probing': False,
+        })
+
+    def before_request(self, host):
+        """
+        Raises a CircuitOpenError if no request should be sent to `host` now.
+        """
+        with self._lock:
+            h = self.__get_host(host)
+            if h['opened_on'] is None:
+                return
+
+            if (h['probing'] or
+                    time.monotonic() - h['opened_on'] < self._reset_timeout):
+                raise CircuitOpenError('Too many failures on %s, not trying '
+                                       'again for now' % host)
+
+            # Half-open: this request is the probe
+            h['probing'] = True
+
+    def success(self, host):
+        with self._lock:
+            h = self.__get_host(host)
+            if h['opened_on'] is not None:
+                logging.info("%s is reachable again" % host)
+            h.update(failures=0, opened_on=None, probing=False)
+
+    def failure(self, host):
+        with self._lock:
+            h = self.__get_host(host)
+            h['failures'] += 1
+            if h['probing'] or h['failures'] >= self._max_failures:
+                if h['opened_on'] is None:
+                    logging.warning("%s failed %d times in a row, giving up "
+                                    "on it for %ds" %
+                                    (host, h['failures'],
+                                     self._reset_timeout))
+                h.update(opened_on=time.monotonic(), probing=False)
+
+    def is_open(self, host):
+        with self._lock:
+            return self.__get_host(host)['opened_on'] is not None
+
+
+def _get_size(r):
+    content_range = r.headers.get('Content-Range')
+    if content_range:
+        m = re.match(r'bytes\s+\d+-\d+/(\d+)', content_range)
+        if m:
+            return int(m.group(1))
+        return None
+
+    try:
+        return int(r.headers['Content-Length'])
+    except (KeyError, ValueError):
+        return None
+
+
+def probe(url, session=requests, headers=None):
+    """
+    Checks that `url` exists without downloading it, and returns an
+    `ArtifactInfo` describing it.
+
+    A HEAD request is tried first. If the server rejects the method, a GET
+    with a `Range: bytes=0-0` header is sent instead, and its body is never
+    read, so that a server ignoring the range does not make us download the
+    whole file.
+
+    `session`: anything providing the `head` and `get` methods of the requests
+    API. Defaults to the `requests` module itself.
+    `headers`: optional dict of extra headers to send.
+
+    This raises the usual `requests.exceptions` errors, including `HTTPError`
+    if the remote file is not available.
+    When `headers` make the request conditional, and the server answers that
+    the file was not modified, None is returned.
+    """
+    r = session.head(url, headers=headers, allow_redirects=True)
+    if r.status_code in HEAD_REJECTED_CODES:
+        ranged_headers = dict(headers or {})
+        ranged_headers['Range'] = 'bytes=0-0'
+        r = session.get(url, headers=ranged_headers, stream=True)
+        r.close()
+    r.raise_for_status()
+
+    if r.status_code == 304:
+        return None
+
+    return ArtifactInfo(url, _get_size(r), r.headers.get('Last-Modified'),
+                        r.headers.get('ETag'))
+
+
+class HTTPClient(object):
+    """
+    This class is a pooled, keep-alive HTTP client meant to be shared by all
+    the crawlers and the RootfsChooser of a launch, so that requests to the
+    same host reuse the same few connections.
+
+    It provides the `get` and `head` methods of the requests API, and sets
+    the timeouts of every request unless given explicitly.
+
+    `pool_size`: the number of connections kept alive per host.
+    `connect_timeout`, `read_timeout`: the timeouts of each request, in
+    seconds.
+    `budget`: the maximum number of requests this client may send, or None for
+    no limit. Once it is exhausted, every request raises a
+    `RequestBudgetError`.
+    `retries`: the number of times a request failing with a connection error,
+    a timeout or a 502/503/504 answer is sent again, after an exponential
+    backoff starting at `backoff` seconds, with some jitter.
+    `health`: the `HostHealth` circuit breaker to use. If not given, the client
+    uses its own.
+    """
+    # Number of distinct hosts we keep a connection pool for
+    _POOLS_COUNT = 10
+
+    # Maximum time to wait before retrying, in seconds
+    _MAX_BACKOFF = 30
+
+    def __init__(self, pool_size=10, connect_timeout=10, read_timeout=60,
+                 budget=None, retries=2, backoff=0.5, health=None):
+        self._timeout = (connect_timeout, read_timeout)
+        self._budget = budget
+        self._retries = retries
+        self._backoff = backoff
+        self._health = health or HostHealth()
+        self._count = 0
+        self._lock = threading.Lock()
+
+        self._session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=self._POOLS_COUNT,
+                              pool_maxsize=pool_size)
+        self._session.mount('http://', adapter)
+        self._session.mount('https://', adapter)
+
+    @classmethod
+    def from_config(cls, cfg):
+        """
+        Builds a client from the optional `http_pool_size`,
+        `http_connect_timeout`, `http_read_timeout`, `http_request_budget`,
+        `http_retries`, `http_backoff`, `circuit_max_failures` and
+        `circuit_reset_timeout` keys of `cfg`.
+        """
+        kwargs = {}
+        for key, arg, conv in [('http_pool_size', 'pool_size', int),
+                               ('http_connect_timeout', 'connect_timeout',
+                                float),
+                               ('http_read_timeout', 'read_timeout', float),
+                               ('http_request_budget', 'budget', int),
+                               ('http_retries', 'retries', int),
+                               ('http_backoff', 'backoff', float)]:
+            if key in cfg:
+                kwargs[arg] = conv(cfg[key])
+
+        health_kwargs = {}
+        for key, arg, conv in [('circuit_max_failures', 'max_failures', int),
+                               ('circuit_reset_timeout', 'reset_timeout',
+                                float)]:
+            if key in cfg:
+                health_kwargs[arg] = conv(cfg[key])
+
+        return cls(health=HostHealth(**health_kwargs), **kwargs)
+
+    def __consume_budget(self):
+        with self._lock:
+            if self._budget is not None and self._count >= self._budget:
+                raise RequestBudgetError(
+                    'Request budget of %d exhausted' % self._budget)
+            self._count += 1
+
+    def __wait(self, attempt):
+        delay = min(self._backoff * 2 ** attempt, self._MAX_BACKOFF)
+        time.sleep(random.uniform(delay / 2, delay))
+
+    def request(self, method, url, **kwargs):
+        kwargs.setdefault('timeout', self._timeout)
+        host = urlparse(url).netloc
+
+        attempt = 0
+        while True:
+            # Nothing may fail between the start of a probe and its outcome
+            self.__consume_budget()
+            self._health.before_request(host)
+            try:
+                r = self._session.request(method, url, **kwargs)
+            except (requests.exceptions.ConnectionError,
+                    requests.exceptions.Timeout) as e:
+                self._health.failure(host)
+                if attempt >= self._retries:
+                    raise
+                logging.debug("%s %s failed (%s), retrying" %
+                              (method, url, e))
+            except Exception:
+                # Not worth retrying, but it must not leave a probe pending
+                self._health.failure(host)
+                raise
+            else:
+                if r.status_code not in TRANSIENT_CODES:
+                    self._health.success(host)
+                    return r
+
+                self._health.failure(host)
+                if attempt >= self._retries:
+                    return r
+                logging.debug("%s %s answered %d, retrying" %
+                              (method, url, r.status_code))
+                r.close()
+
+            self.__wait(attempt)
+            attempt += 1
+
+    def get(self, url, **kwargs):
+        return self.request('GET', url, **kwargs)
+
+    def head(self, url, **kwargs):
+        return self.request('HEAD', url, **kwargs)
+
+    def probe(self, url, headers=None):
+        """
+        See the `probe` function.
+        """
+        return probe(url, self, headers)
+
+    def get_requests_count(self):
+        with self._lock:
+            return self._count
+
+    def close(self):
+        self._session.close()
@@ -0,0 +1,193 @@
+import yaml
+
+try:
+    # The C implementation of the parser is way faster
+    from yaml import CSafeLoader as SafeLoader
+except ImportError:
+    from yaml import SafeLoader
+
+
+class InvalidJobError(Exception):
+    pass
+
+
+# The subset of the LAVA job schema our templates have to follow
+
+PRIORITIES = ('high', 'medium', 'low')
+
+VISIBILITIES = ('public', 'personal')
+
+DURATION_UNITS = ('days', 'hours', 'minutes', 'seconds')
+
+# The mandatory keys of each kind of action
+ACTIONS = {
+    'deploy': ('to',),
+    'boot': ('method',),
+    'test': (),
+    'command': ('name',),
+}
+
+DEFINITION_KEYS = ('from', 'name', 'path', 'repository')
+
+
+def _check(condition, path, message):
+    if not condition:
+        raise InvalidJobError("%s: %s" % (path, message))
+
+
+def _check_mapping(data, path):
+    _check(isinstance(data, dict), path, "should be a mapping")
+
+
+def _check_string(data, path):
+    _check(isinstance(data, str) and data, path,
+           "should be a non empty string")
+
+
+def _check_duration(data, path):
+    _check_mapping(data, path)
+    _check(data, path, "should not be empty")
+    for unit, value in data.items():
+        _check(unit in DURATION_UNITS, "%s.%s" % (path, unit),
+               "unknown unit, should be one of %s" % ", ".join(DURATION_UNITS))
+        _check(isinstance(value, int) and not isinstance(value, bool) and
+               value > 0, "%s.%s" % (path, unit),
+               "should be a positive integer")
+
+
+def _check_timeouts(data, path):
+    _check_mapping(data, path)
+    _check('job' in data, path, "missing job timeout")
+    for key, value in data.items():
+        subpath = "%s.%s" % (path, key)
+        if key in ('job', 'action', 'connection'):
+            _check_duration(value, subpath)
+        elif key in ('actions', 'connections'):
+            _check_mapping(value, subpath)
+            for name, duration in value.items():
+                _check_duration(duration, "%s.%s" % (subpath, name))
+        else:
+            _check(False, subpath, "unknown timeout")
+
+
+def _check_roles(data, path):
+    _check_mapping(data, path)
+    _check(data, path, "should define at least one role")
+    for role, config in data.items():
+        subpath = "%s.%s" % (path, role)
+        _check_mapping(config, subpath)
+        _check_string(config.get('device_type'), "%s.device_type" % subpath)
+        count = config.get('count')
+        _check(isinstance(count, int) and not isinstance(count, bool) and
+               count > 0, "%s.count" % subpath, "should be a positive integer")
+        if 'timeout' in config:
+            _check_duration(config['timeout'], "%s.timeout" % subpath)
+
+    return set(data)
+
+
+def _check_definitions(data, path):
+    _check(isinstance(data, list) and data, path,
+           "should be a non empty list")
+    for i, definition in enumerate(data):
+        subpath = "%s[%d]" % (path, i)
+        _check_mapping(definition, subpath)
+        for key in DEFINITION_KEYS:
+            _check(key in definition, subpath, "missing %s" % key)
+
+
+def _check_action(data, path, roles):
+    _check(isinstance(data, dict) and len(data) == 1, path,
+           "should be a mapping with a single key")
+    kind, action = next(iter(data.items()))
+    path = "%s.%s" % (path, kind)
+    _check(kind in ACTIONS, path, "unknown action, should be one of %s" %
+           ", ".join(sorted(ACTIONS)))
+    _check_mapping(action, path)
+    for key in ACTIONS[kind]:
+        _check(key in action, path, "missing %s" % key)
+
+    if 'timeout' in action:
+        _check_duration(action['timeout'], "%s.timeout" % path)
+
+    if kind == 'test':
+        _check('definitions' in action or 'monitors' in action or
+               'interactive' in action, path,
+               "missing definitions, monitors or interactive")
+        if 'definitions' in action:
+            _check_definitions(action['definitions'],
+                               "%s.definitions" % path)
+
+    if roles:
+        action_roles = action.get('role')
+        _check(isinstance(action_roles, list) and action_roles,
+               "%s.role" % path, "should be a non empty list in a multinode "
+               "job")
+        for role in action_roles:
+            _check(role in roles, "%s.role" % path, "unknown role %s" % role)
+
+
+def check_job(job):
+    """
+    Checks the structure of the `job` definition, as parsed from its YAML.
+    This raises an InvalidJobError describing the first problem found, if any.
+    """
+    _check_mapping(job, "job")
+    _check_string(job.get('job_name'), "job_name")
+
+    roles = None
+    protocols = job.get('protocols', {})
+    _check_mapping(protocols, "protocols")
+    if 'lava-multinode' in protocols:
+        multinode = protocols['lava-multinode']
+        _check_mapping(multinode, "protocols.lava-multinode")
+        roles = _check_roles(multinode.get('roles'),
+                             "protocols.lava-multinode.roles")
+    else:
+        _check_string(job.get('device_type'), "device_type")
+
+    _check('timeouts' in job, "job", "missing timeouts")
+    _check_timeouts(job['timeouts'], "timeouts")
+
+    if 'priority' in job:
+        priority = job['priority']
+        _check(priority in PRIORITIES or
+               (isinstance(priority, int) and 0 <= priority <= 100),
+               "priority", "should be one of %s, or between 0 and 100" %
+               ", ".join(PRIORITIES))
+
+    if 'visibility' in job:
+        visibility = job['visibility']
+        _check(visibility in VISIBILITIES or
+               (isinstance(visibility, dict) and list(visibility) == ['group']),
+               "visibility", "should be one of %s, or a group" %
+               ", ".join(VISIBILITIES))
+
+    actions = job.get('actions')
+    _check(isinstance(actions, list) and actions, "actions",
+           "should be a non empty list")
+    for i, action in enumerate(actions):
+        _check_action(action, "actions[%d]" % i, roles)
+
+    if 'notify' in job:
+        _check_mapping(job['notify'], "notify")
+        _check('criteria' in job['notify'], "notify", "missing criteria")
+
+
+def load(job):
+    """
+    Parses the `job` YAML string.
+    This raises an InvalidJobError if it isn't valid YAML.
+    """
+    try:
+        return yaml.load(job, Loader=SafeLoader)
+    except yaml.YAMLError as e:
+        raise InvalidJobError("invalid YAML: %s" % e)
+
+
+def validate(job):
+    """
+    Parses the `job` YAML string and checks its structure.
+    This raises an InvalidJobError if it isn't a valid LAVA job.
+    """
+    check_job(load(job))
@@ -4,8 +4,9 @@ import os
 import sys
 
 from src.CTTFormatter import CTTFormatter
-from src.Config import OptionError, ConfigFileError
+from src.Config import OptionError, ConfigFileError, get_cache_dir
 from src.crafter import JobCrafter
+from src.outbox import Outbox
 
 class BaseLauncher(object):
     """
@@ -59,7 +60,45 @@ class BaseLauncher(object):
             self._logger.setLevel(logging.INFO)
 
         # TODO: handle exceptions
-        self.crafter = JobCrafter(self._boards_config, self._cfg)
+        self.crafter = JobCrafter(self._boards_config, self._cfg,
+                                  self._get_outbox())
+
+    def _get_outbox(self):
+        """
+        Returns the Outbox keeping the jobs that couldn't be sent, or None if
+        they are not sent at all, or if nothing should be kept from one run to
+        the other.
+        """
+        if self._cfg['no_send'] or ('no_cache' in self._cfg and
+                                    self._cfg['no_cache']):
+            return None
+
+        if 'outbox_ttl' in self._cfg:
+            ttl = float(self._cfg['outbox_ttl'])
+        else:
+            ttl = 86400
+        return Outbox(os.path.join(get_cache_dir(self._cfg), 'outbox'), ttl)
+
+    def _flush(self):
+        """
+        Sends the jobs kept in the outbox.
+        """
+        outbox = self.crafter.writer.outbox
+        if outbox is None:
+            logging.warning("No outbox to flush")
+            return
+
+        sent, left = outbox.flush(self.crafter.writer)
+        self._record_flushed(sent)
+        logging.info("%d jobs sent from the outbox, %d left" %
+                     (len(sent), left))
+
+    def _record_flushed(self, jobs):
+        """
+        Records that the `RenderedJob` of the `jobs` list were sent from the
+        outbox. Nothing is recorded by default.
+        """
+        pass
 
     def launch(self):
         raise NotImplementedError("Missing launching function")
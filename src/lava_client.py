@@ -0,0 +1,126 @@
+import queue
+import threading
+import urllib.parse
+import xmlrpc.client
+
+
+# Request bodies bigger than this many bytes are sent gzipped, when enabled
+GZIP_THRESHOLD = 1024
+
+
+def _make_transport_class(base):
+    class _KeepAliveTransport(base):
+        """
+        A transport keeping its single connection alive from one request to
+        the other, with a timeout.
+        """
+
+        def __init__(self, timeout, gzip_requests=False):
+            super(_KeepAliveTransport, self).__init__()
+            self._timeout = timeout
+            if gzip_requests:
+                self.encode_threshold = GZIP_THRESHOLD
+            else:
+                self.encode_threshold = None
+
+        def make_connection(self, host):
+            connection = super(_KeepAliveTransport, self).make_connection(host)
+            connection.timeout = self._timeout
+            return connection
+
+    return _KeepAliveTransport
+
+
+_HTTPTransport = _make_transport_class(xmlrpc.client.Transport)
+_HTTPSTransport = _make_transport_class(xmlrpc.client.SafeTransport)
+
+
+class PooledTransport(object):
+    """
+    This class is an XML-RPC transport that several threads can share.
+
+    It keeps up to `pool_size` HTTP/1.1 connections alive, and hands one to
+    each request, waiting for one to be free when they are all busy.
+    The server is allowed to answer gzipped.
+
+    `https`: whether to connect with TLS.
+    `timeout`: the timeout of the connections, in seconds.
+    `gzip_requests`: whether to send the requests gzipped when they are big
+    enough. The server has to support gzipped requests.
+    """
+
+    def __init__(self, https=False, timeout=60, pool_size=4,
+                 gzip_requests=False):
+        self._class = _HTTPSTransport if https else _HTTPTransport
+        self._timeout = timeout
+        self._gzip_requests = gzip_requests
+        self._pool_size = max(pool_size, 1)
+        self._created = 0
+        self._free = queue.LifoQueue()
+        self._lock = threading.Lock()
+
+    def __get_transport(self):
+        try:
+            return self._free.get_nowait()
+        except queue.Empty:
+            pass
+
+        with self._lock:
+            if self._created < self._pool_size:
+                self._created += 1
+                return self._class(self._timeout, self._gzip_requests)
+
+        return self._free.get()
+
+    def request(self, host, handler, request_body, verbose=False):
+        transport = self.__get_transport()
+        try:
+            return transport.request(host, handler, request_body, verbose)
+        finally:
+            self._free.put(transport)
+
+    def close(self):
+        """
+        Closes the connections not in use.
+        """
+        while True:
+            try:
+                self._free.get_nowait().close()
+            except queue.Empty:
+                break
+            with self._lock:
+                self._created -= 1
+
+
+def get_server_proxy(url, timeout=60, pool_size=4, allow_none=False,
+                     gzip_requests=False):
+    """
+    Returns an `xmlrpc.client.ServerProxy` to the LAVA API at `url`, using a
+    `PooledTransport`, so that it can be shared by all the threads of a
+    process.
+
+    `timeout`: the timeout of each request, in seconds.
+    `pool_size`: the number of requests sent at the same time, at most.
+    `gzip_requests`: whether to gzip the big requests, which the server has
+    to support.
+    """
+    https = urllib.parse.urlparse(url).scheme == 'https'
+    transport = PooledTransport(https, timeout, pool_size, gzip_requests)
+    return xmlrpc.client.ServerProxy(url, transport, allow_none=allow_none)
+
+
+def get_server_proxy_from_config(url, cfg, allow_none=False):
+    """
+    Same as `get_server_proxy`, with the optional `lava_timeout`,
+    `lava_pool_size` and `lava_gzip_requests` keys of `cfg`.
+    """
+    kwargs = {}
+    if 'lava_timeout' in cfg:
+        kwargs['timeout'] = float(cfg['lava_timeout'])
+    if 'lava_pool_size' in cfg:
+        kwargs['pool_size'] = int(cfg['lava_pool_size'])
+    if 'lava_gzip_requests' in cfg:
+        kwargs['gzip_requests'] = (str(cfg['lava_gzip_requests']).lower() in
+                                   ('1', 'yes', 'true', 'on'))
+
+    return get_server_proxy(url, allow_none=allow_none, **kwargs)
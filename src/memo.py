@@ -0,0 +1,66 @@
+import threading
+import time
+
+
+class Memoizer(object):
+    """
+    This class memoizes the values computed for some keys, such as the answers
+    of remote servers, so that each one is computed only once.
+
+    A single instance can be shared by several threads. Concurrent lookups of
+    the same key are collapsed: the first caller does the actual computation,
+    the others wait for it and get its answer.
+
+    `ttl`: the number of seconds an entry stays valid. It defaults to None,
+    meaning the entries never expire.
+    """
+
+    def __init__(self, ttl=None):
+        self._ttl = ttl
+        self._entries = {}
+        self._key_locks = {}
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+
+    def __get_key_lock(self, key):
+        with self._lock:
+            return self._key_locks.setdefault(key, threading.Lock())
+
+    def __is_valid(self, entry):
+        if self._ttl is None:
+            return True
+        return time.monotonic() - entry[1] < self._ttl
+
+    def get(self, key, fetch):
+        """
+        Returns the value memoized for `key`, calling `fetch` without argument
+        to compute it when there is none.
+        Exceptions raised by `fetch` are not memoized.
+        """
+        with self.__get_key_lock(key):
+            entry = self._entries.get(key)
+            if entry is not None and self.__is_valid(entry):
+                with self._lock:
+                    self._hits += 1
+                return entry[0]
+
+            with self._lock:
+                self._misses += 1
+            value = fetch()
+            self._entries[key] = (value, time.monotonic())
+            return value
+
+    def put(self, key, value):
+        """
+        Stores an already computed value for `key`.
+        """
+        with self.__get_key_lock(key):
+            self._entries[key] = (value, time.monotonic())
+
+    def stats(self):
+        """
+        Returns a dict with the `hits` and `misses` counts.
+        """
+        with self._lock:
+            return {'hits': self._hits, 'misses': self._misses}
@@ -0,0 +1,133 @@
+import json
+import logging
+import os
+import random
+import threading
+import time
+
+from src.crafter import RenderedJob
+from src.fileutils import write_json_atomically
+
+
+class Outbox(object):
+    """
+    This class keeps the jobs that couldn't be sent, so that they can be sent
+    later, once the LAVA server or the devices are available again.
+
+    Each job is a JSON file in the `path` directory, named after the job and
+    written atomically, so that a job put twice is only kept once, and a crash
+    never leaves a partial file behind.
+    The jobs older than `ttl` seconds are dropped.
+    """
+
+    def __init__(self, path, ttl=86400):
+        self._path = path
+        self._ttl = ttl
+        self._lock = threading.Lock()
+
+    def __get_file(self, name):
+        return os.path.join(self._path, '%s.json' % name.replace(os.sep, '_'))
+
+    def put(self, job):
+        """
+        Spools the `RenderedJob` `job`. If it is already there, it keeps its
+        date, and counts one more attempt.
+        """
+        with self._lock:
+            entry = {
+                'spec': job.spec,
+                'board': job.board,
+                'name': job.name,
+                'job': job.job,
+                'spooled_on': time.time(),
+                'attempts': 0,
+            }
+            try:
+                with open(self.__get_file(job.name)) as f:
+                    old = json.load(f)
+                entry['spooled_on'] = old['spooled_on']
+                entry['attempts'] = old['attempts'] + 1
+            except (OSError, ValueError, KeyError):
+                pass
+
+            write_json_atomically(self.__get_file(job.name), entry,
+                                  '.outbox-')
+
+        logging.info("  ==> Job %s kept in the outbox" % job.name)
+
+    def remove(self, name):
+        with self._lock:
+            try:
+                os.unlink(self.__get_file(name))
+            except FileNotFoundError:
+                pass
+
+    def get_jobs(self):
+        """
+        Returns the list of the `RenderedJob` spooled, the oldest first, after
+        dropping the expired ones.
+        """
+        entries = []
+        with self._lock:
+            try:
+                files = os.listdir(self._path)
+            except FileNotFoundError:
+                return []
+
+            for name in files:
+                if name.startswith('.') or not name.endswith('.json'):
+                    continue
+                path = os.path.join(self._path, name)
+                try:
+                    with open(path) as f:
+                        entry = json.load(f)
+                except (OSError, ValueError):
+                    continue
+
+                if time.time() - entry['spooled_on'] >= self._ttl:
+                    logging.warning("  Job %s expired after %d attempts, "
+                                    "dropping it" %
+                                    (entry['name'], entry['attempts']))
+                    os.unlink(path)
+                    continue
+
+                entries.append(entry)
+
+        entries.sort(key=lambda e: e['spooled_on'])
+        # The spec is a tuple, that JSON turned into a list
+        return [RenderedJob(tuple(e['spec']) if e.get('spec') else None,
+                            e['board'], e['name'], e['job'])
+                for e in entries]
+
+    def flush(self, writer, retries=3, backoff=5):
+        """
+        Sends the jobs spooled through `writer`, trying again `retries` times
+        for the ones that can't be sent, after an exponential backoff starting
+        at `backoff` seconds.
+        The `writer` is expected to put the jobs it can't send back in the
+        outbox.
+
+        It returns the list of the `RenderedJob` sent, and the number of jobs
+        left in the outbox.
+        """
+        sent = []
+        for attempt in range(retries + 1):
+            if attempt:
+                delay = backoff * 2 ** (attempt - 1)
+                time.sleep(random.uniform(delay / 2, delay))
+
+            jobs = self.get_jobs()
+            if not jobs:
+                break
+
+            logging.info("Sending %d jobs from the outbox" % len(jobs))
+            for job, out in writer.write_many(jobs):
+                if not out:
+                    continue
+                for output in out:
+                    logging.info("  ==> Job %s saved to: %s" %
+                                 (job.name, output))
+                self.remove(job.name)
+                sent.append(job)
+
+        return sent, len(self.get_jobs())
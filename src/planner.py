@@ -0,0 +1,119 @@
+import hashlib
+import logging
+from collections import namedtuple, OrderedDict
+
+
+# A single job of a CI run
+JobSpec = namedtuple('JobSpec', ['board', 'tree', 'branch', 'defconfig',
+                                 'test', 'job_name'])
+
+
+def get_test_configs(board_config, test):
+    """
+    Returns the list of the configs to run `test` with, given the
+    `board_config` entry of ci_tests.json it belongs to: the board configs,
+    unless overridden by the test, without the ones the test excludes.
+    """
+    if 'configs' in test:
+        configs = test['configs']
+        logging.debug("  Configs overridden for %s: %s" %
+                      (test['name'], configs))
+    else:
+        configs = board_config['configs']
+
+    if 'exclude_configs' in test:
+        logging.debug("  Configs excluded for %s: %s" %
+                      (test['name'], test['exclude_configs']))
+        configs = [c for c in configs if c not in test['exclude_configs']]
+
+    return configs
+
+
+def make_plan(tests_config, boards):
+    """
+    Expands the `tests_config` (the ci_tests.json structure) of the `boards`
+    list into a tuple of `JobSpec`, ordered by board, then test, then config.
+    Duplicated jobs are only planned once.
+    """
+    plan = []
+    seen = set()
+    for board in boards:
+        for test in tests_config[board]['tests']:
+            for config in get_test_configs(tests_config[board], test):
+                job_name = "%s--%s--%s--%s--%s" % (
+                        board, config['tree'], config['branch'],
+                        config['defconfig'], test['name'])
+                if job_name in seen:
+                    logging.debug("  Job %s planned twice" % job_name)
+                    continue
+
+                seen.add(job_name)
+                plan.append(JobSpec(board, config['tree'], config['branch'],
+                                    config['defconfig'], test['name'],
+                                    job_name))
+
+    return tuple(plan)
+
+
+def group_by_board(plan):
+    """
+    Returns an OrderedDict of the jobs of `plan`, by board, in the order of
+    the plan.
+    """
+    boards = OrderedDict()
+    for spec in plan:
+        boards.setdefault(spec.board, []).append(spec)
+
+    return boards
+
+
+def summarize(plan):
+    """
+    Returns a dict describing `plan`: the `total` number of jobs, the number
+    of jobs per `boards`, `trees` and `tests`, and the `jobs` themselves.
+    """
+    summary = {
+        'total': len(plan),
+        'boards': {},
+        'trees': {},
+        'tests': {},
+        'jobs': [spec._asdict() for spec in plan],
+    }
+    for spec in plan:
+        for key, value in [('boards', spec.board), ('trees', spec.tree),
+                           ('tests', spec.test)]:
+            summary[key][value] = summary[key].get(value, 0) + 1
+
+    return summary
+
+
+def _get_hash(spec):
+    return hashlib.sha1(spec.job_name.encode('utf-8')).hexdigest()
+
+
+def shard(plan, index, count, cost=None):
+    """
+    Returns the jobs of `plan` belonging to the shard `index` (starting at 1)
+    out of `count`, in the order of the plan.
+
+    Each job goes to exactly one shard. The jobs are spread over the shards
+    from the most expensive to the cheapest, each one going to the shard with
+    the lowest total cost so far, and the jobs of the same cost are taken in
+    the order of the hash of their name. The partition thus only depends on the
+    content of the plan, and every runner computing it gets the same one.
+
+    `cost`: a function returning the cost of a job, such as its expected
+    duration. All jobs cost the same by default.
+    """
+    if cost is None:
+        cost = lambda spec: 1
+
+    loads = [0] * count
+    assigned = set()
+    for spec in sorted(plan, key=lambda s: (-cost(s), _get_hash(s))):
+        target = loads.index(min(loads))
+        loads[target] += cost(spec)
+        if target == index - 1:
+            assigned.add(spec)
+
+    return tuple(spec for spec in plan if spec in assigned)
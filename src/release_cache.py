@@ -0,0 +1,15 @@
+from src.memo import Memoizer
+
+
+class ReleaseCache(Memoizer):
+    """
+    This class memoizes the latest release of each tree/branch, so that it is
+    resolved only once per launch, whatever the number of boards and configs
+    using it.
+
+    A single instance is meant to be shared by all the crawlers of a launch.
+
+    `ttl`: the number of seconds an entry stays valid. It defaults to None,
+    meaning the entries never expire, which is what a single CI run wants.
+    Long-running users can set it to pick up new releases.
+    """
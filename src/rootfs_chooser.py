@@ -1,6 +1,9 @@
 import logging
 import requests
 
+from src.http_client import HTTPClient
+from src.memo import Memoizer
+
 class RootfsAccessError(Exception):
     pass
 
@@ -11,24 +14,48 @@ class RootfsChooser(object):
     """
     This class basically crafts and checks the URL for the rootfs given a board
     dictionary containing at least the `rootfs` key.
+
+    Each rootfs is only checked once, without being downloaded, whatever the
+    number of boards using it.
     """
     __ROOTFS_BASE = 'http://lava.bootlin.com/downloads/rootfs'
 
+    def __init__(self, http=None, index=None):
+        """
+        `http` is the `HTTPClient` to send the requests with. If not given, the
+        chooser uses its own.
+
+        `index` is an optional `ArtifactIndex` to remember the root filesystems
+        from one run to the other.
+        """
+        self._http = http or HTTPClient()
+        self._index = index
+        self._checked = Memoizer()
+
+    def __check(self, rootfs):
+        try:
+            if self._index:
+                self._index.probe(self._http, rootfs)
+            else:
+                self._http.probe(rootfs)
+        except (requests.exceptions.HTTPError,
+                requests.exceptions.ConnectionError,
+                requests.exceptions.Timeout) as err:
+            raise RootfsAccessError(
+                    'Rootfs not available: %s (err: %s)' % (rootfs, err))
+
+        return rootfs
+
     def get_url(self, board):
         try:
             if board['test_plan'] == "boot":
                 rootfs = '%s/%s.cpio.gz' % (self.__ROOTFS_BASE, board['rootfs'])
             elif board['test_plan'] == "boot-nfs":
                 rootfs = '%s/%s.tar.gz' % (self.__ROOTFS_BASE, board['rootfs'])
+            else:
+                raise RootfsConfigError()
         except:
             raise RootfsConfigError("Unable to guess rootfs type to use.")
-        try:
-            r = requests.get(rootfs)
-            r.raise_for_status()
-        except (requests.exceptions.HTTPError,
-                requests.exceptions.ConnectionError) as err:
-            raise RootfsAccessError(
-                    'Rootfs not available: %s (err: %s)' % (rootfs, err))
-
-        return rootfs
 
+        return self._checked.get((board['rootfs'], board['test_plan']),
+                                 lambda: self.__check(rootfs))
@@ -0,0 +1,175 @@
+import logging
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+from src.executor import BufferingFilter
+
+
+class TokenBucket(object):
+    """
+    This class limits the rate of some operation to `rate` per second on
+    average, allowing bursts of up to `burst` operations at once.
+    """
+
+    def __init__(self, rate, burst=1):
+        self._rate = float(rate)
+        self._capacity = max(burst, 1)
+        self._tokens = self._capacity
+        self._last = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """
+        Waits until the operation is allowed.
+        """
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self._capacity, self._tokens +
+                                   (now - self._last) * self._rate)
+                self._last = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self._rate
+
+            time.sleep(wait)
+
+
+_buckets = {}
+_buckets_lock = threading.Lock()
+
+
+def get_token_bucket(server, rate, burst=1):
+    """
+    Returns the `TokenBucket` limiting the requests to `server`, so that all
+    the submitters of a process sending to the same server share it.
+    """
+    with _buckets_lock:
+        if server not in _buckets:
+            _buckets[server] = TokenBucket(rate, burst)
+        return _buckets[server]
+
+
+class Submitter(object):
+    """
+    This class sends the rendered jobs through a writer, from a pool of
+    `workers` threads, while they are still being rendered.
+
+    The jobs are handed to the writer by groups of its `batch_size`, each
+    group being sent with a single call to its `write_many` method. Only a
+    couple of groups per worker are waiting to be sent at any time: past that,
+    no more jobs are taken until one is sent, so that the rendering can't get
+    too far ahead of the submission.
+
+    `bucket`: an optional `TokenBucket` each group has to go through before
+    being sent.
+
+    The log records emitted while sending a group are held back, and emitted
+    from the thread calling `submit_many` along with its results, so that they
+    are buffered by a `MatrixExecutor` like the other records of that thread.
+    """
+
+    def __init__(self, writer, workers=1, bucket=None):
+        self._writer = writer
+        self._workers = max(workers, 1)
+        self._batch_size = max(getattr(writer, 'batch_size', 1), 1)
+        self._bucket = bucket
+        self._pool = ThreadPoolExecutor(self._workers)
+        self._log_filter = BufferingFilter()
+        logging.getLogger().addFilter(self._log_filter)
+        self._lock = threading.Lock()
+        self._count = 0
+        self._total_latency = 0
+        self._max_latency = 0
+
+    def __send(self, batch):
+        """
+        Sends the `batch`, and returns its results, or the exception raised,
+        with the log records emitted meanwhile.
+        """
+        self._log_filter.start()
+        results = None
+        error = None
+        try:
+            if self._bucket is not None:
+                self._bucket.acquire()
+            results = list(self._writer.write_many(job for job, start
+                                                   in batch))
+        except Exception as e:
+            error = e
+        finally:
+            records = self._log_filter.stop()
+
+        return results, error, records
+
+    def __get_results(self, batch, future):
+        results, error, records = future.result()
+        logger = logging.getLogger()
+        for record in records:
+            logger.handle(record)
+        if error is not None:
+            logging.error("  ==> Unable to send %d jobs: %s" %
+                          (len(batch), error), exc_info=error)
+            results = [(job, None) for job, start in batch]
+
+        end = time.monotonic()
+        with self._lock:
+            for job, start in batch:
+                self._count += 1
+                self._total_latency += end - start
+                self._max_latency = max(self._max_latency, end - start)
+
+        return results
+
+    def submit_many(self, jobs):
+        """
+        Sends the `RenderedJob` of the `jobs` iterable, and yields a (job, list
+        of the locations it was saved to) couple for each one, in the same
+        order. The list is None if the job couldn't be sent.
+        """
+        pending = deque()
+        batch = []
+
+        def submit():
+            pending.append((list(batch), self._pool.submit(self.__send,
+                                                           list(batch))))
+            del batch[:]
+
+        for job in jobs:
+            batch.append((job, time.monotonic()))
+            if len(batch) < self._batch_size:
+                continue
+
+            submit()
+            # Don't take new jobs while too many are waiting
+            while pending and (len(pending) > 2 * self._workers or
+                               pending[0][1].done()):
+                for result in self.__get_results(*pending.popleft()):
+                    yield result
+
+        if batch:
+            submit()
+        while pending:
+            for result in self.__get_results(*pending.popleft()):
+                yield result
+
+    def stats(self):
+        """
+        Returns a dict with the `count` of jobs handled, and their `average`
+        and `max` latency in seconds, from the time they were rendered to the
+        time they were sent.
+        """
+        with self._lock:
+            average = self._total_latency / self._count if self._count else 0
+            return {
+                'count': self._count,
+                'average': average,
+                'max': self._max_latency,
+            }
+
+    def close(self):
+        self._pool.shutdown()
+        logging.getLogger().removeFilter(self._log_filter)
@@ -1,8 +1,12 @@
 import logging
 import os
+import threading
+import time
 import urllib
 import xmlrpc.client
 
+from src.lava_client import get_server_proxy_from_config
+
 
 class BaseError(Exception):
     pass
@@ -20,10 +24,15 @@ class Writer(object):
     It take in its constructor a dictionary-like object to contain the needed
     informations to save the jobs. The actual mandatory keys depends on the
     implementation of the write method.
+    It can also take an `Outbox`, to keep the jobs that couldn't be saved.
     """
 
-    def __init__(self, cfg):
+    # Number of jobs `write_many` is best given at once
+    batch_size = 1
+
+    def __init__(self, cfg, outbox=None):
         self._cfg = cfg
+        self.outbox = outbox
 
     def write(self, board, name, job):
         """
@@ -32,6 +41,48 @@ class Writer(object):
         """
         raise NotImplementedError('Missing write method')
 
+    def spool(self, job):
+        """
+        Keeps the `RenderedJob` `job`, that couldn't be saved for now, in the
+        outbox given to the constructor, if any.
+        """
+        if self.outbox is not None:
+            self.outbox.put(job)
+
+    def unspool(self, name):
+        """
+        Drops the job called `name`, that was just saved, from the outbox given
+        to the constructor, if any, so that it isn't sent again.
+        """
+        if self.outbox is not None:
+            self.outbox.remove(name)
+
+    def write_many(self, jobs, limit=None):
+        """
+        Writes the `RenderedJob` of the `jobs` iterable, one at a time, as
+        they come, and yields a (job, list of the locations it was saved to)
+        couple for each one. The list is None if it couldn't be saved.
+
+        `limit`: an optional context manager entered around each write, to
+        bound the number of writes in progress at the same time.
+        """
+        for job in jobs:
+            try:
+                if limit is None:
+                    out = self.write(job.board, job.name, job.job)
+                else:
+                    with limit:
+                        out = self.write(job.board, job.name, job.job)
+            except UnavailableError as e:
+                logging.warning("  ==> Unable to send job %s: %s" %
+                                (job.name, e))
+                self.spool(job)
+                out = None
+            else:
+                self.unspool(job.name)
+
+            yield job, out
+
 
 class FileWriter(Writer):
     """
@@ -64,10 +115,29 @@ class LavaWriter(Writer):
         - `token`: the LAVA token to get authorization in the API.
         - `web_ui_address`: a string containing the base URL of LAVA to display
           a nice link by appending the job ID once submitted.
+    It also supports the following optional keys:
+        - `device_status_ttl`: the number of seconds the status of the devices
+          is trusted before being fetched again (60).
+        - `lava_timeout`, `lava_pool_size`: see `get_server_proxy`.
+
+    A device type is available as long as one of its devices is.
     """
+    # Statuses of the devices that can't run a job
+    UNAVAILABLE_STATUSES = ('offline', 'offlining', 'retired')
 
-    def __init__(self, cfg):
-        self._cfg = cfg
+    def __init__(self, cfg, outbox=None):
+        super(LavaWriter, self).__init__(cfg, outbox)
+        self._devices = None
+        self._devices_date = None
+        self._devices_lock = threading.Lock()
+        if 'device_status_ttl' in cfg:
+            self._devices_ttl = float(cfg['device_status_ttl'])
+        else:
+            self._devices_ttl = 60
+        if 'submit_batch_size' in cfg:
+            self.batch_size = int(cfg['submit_batch_size'])
+        else:
+            self.batch_size = 20
 
         try:
             u = urllib.parse.urlparse(self._cfg['server'])
@@ -76,31 +146,55 @@ class LavaWriter(Writer):
                                           self._cfg['token'],
                                           u.netloc)
 
-            self._con = xmlrpc.client.ServerProxy(url)
+            self._con = get_server_proxy_from_config(url, self._cfg)
         except xmlrpc.client.Error:
             raise UnavailableError('LAVA device is offline')
 
-    def __get_device_status(self, device):
-        board = "%s_01" % device
+    def __refresh_devices(self):
+        """
+        Fetches the status of all the devices of the farm at once, and indexes
+        them by device type.
+        """
+        try:
+            devices = self._con.scheduler.all_devices()
+        except (xmlrpc.client.Error, OSError) as e:
+            raise UnavailableError('Couldn\'t get the devices status: %s' % e)
 
-        return self._con.scheduler.get_device_status(board)
+        statuses = {}
+        for device in devices:
+            # hostname, device type, status, current job, pipeline
+            statuses.setdefault(device[1], []).append(device[2])
 
-    def write(self, board, name, job):
-        dev = self.__get_device_status(board['device_type'])
-        if dev['status'] == "offline":
-            logging.error("Device is offline, not sending the job")
-            raise UnavailableError('LAVA device is offline')
-        elif dev['status'] == "retired":
+        self._devices = statuses
+        self._devices_date = time.monotonic()
+
+    def __get_device_statuses(self, device_type):
+        with self._devices_lock:
+            if (self._devices is None or time.monotonic() -
+                    self._devices_date >= self._devices_ttl):
+                self.__refresh_devices()
+            return self._devices.get(device_type, [])
+
+    def __check_device(self, board):
+        statuses = self.__get_device_statuses(board['device_type'])
+        if not statuses:
+            logging.error("No such device, not sending the job")
+            raise UnavailableError('No %s device in LAVA' %
+                                   board['device_type'])
+        elif all(s == "retired" for s in statuses):
             logging.error("Device is retired, not sending the job")
             raise UnavailableError('LAVA device is retired')
+        elif all(s in self.UNAVAILABLE_STATUSES for s in statuses):
+            logging.error("Device is offline, not sending the job")
+            raise UnavailableError('LAVA device is offline')
 
+    def __get_urls(self, ret):
         value = list()
         #
         # submit_job can return either an int (if there's one element)
         # or a list of them (if it's a multinode job).
         # This is crappy, but the least crappy way to handle this.
         #
-        ret = self._con.scheduler.submit_job(job)
         try:
             for r in ret:
                 value.append('%s/scheduler/job/%s' %
@@ -110,3 +204,93 @@ class LavaWriter(Writer):
                          (self._cfg['web_ui_address'], ret))
 
         return value
+
+    def write(self, board, name, job):
+        self.__check_device(board)
+        try:
+            ret = self._con.scheduler.submit_job(job)
+        except (xmlrpc.client.ProtocolError, OSError) as e:
+            raise UnavailableError('LAVA server unreachable: %s' % e)
+
+        return self.__get_urls(ret)
+
+    def __submit_batch(self, jobs):
+        """
+        Sends the `jobs` list in a single multicall, and returns the list of
+        the locations each one was saved to, or None for the ones that
+        couldn't be sent.
+        """
+        multicall = xmlrpc.client.MultiCall(self._con)
+        for job in jobs:
+            multicall.scheduler.submit_job(job.job)
+
+        try:
+            results = multicall()
+        except (xmlrpc.client.Error, OSError) as e:
+            logging.warning("  ==> Unable to send %d jobs: %s" %
+                            (len(jobs), e))
+            for job in jobs:
+                self.spool(job)
+            return [None] * len(jobs)
+
+        outs = []
+        for i, job in enumerate(jobs):
+            try:
+                outs.append(self.__get_urls(results[i]))
+                self.unspool(job.name)
+            except xmlrpc.client.Fault as e:
+                logging.warning("  ==> Unable to send job %s: %s" %
+                                (job.name, e.faultString))
+                outs.append(None)
+
+        return outs
+
+    def write_many(self, jobs, limit=None):
+        """
+        See `Writer.write_many`.
+        The jobs are sent by batches of `submit_batch_size` (20), each one in a
+        single `system.multicall` request, and yielded once their batch is
+        sent.
+        """
+        batch_size = self.batch_size
+        if batch_size <= 1:
+            for result in super(LavaWriter, self).write_many(jobs, limit):
+                yield result
+            return
+
+        # The jobs in their order, and whether they are to be sent
+        pending = []
+        batch = []
+
+        def flush():
+            outs = []
+            if batch and limit is None:
+                outs = self.__submit_batch(batch)
+            elif batch:
+                with limit:
+                    outs = self.__submit_batch(batch)
+            outs = iter(outs)
+            results = [(job, next(outs) if sent else None)
+                       for job, sent in pending]
+            del pending[:]
+            del batch[:]
+            return results
+
+        for job in jobs:
+            try:
+                self.__check_device(job.board)
+            except UnavailableError as e:
+                logging.warning("  ==> Unable to send job %s: %s" %
+                                (job.name, e))
+                self.spool(job)
+                pending.append((job, False))
+                continue
+
+            pending.append((job, True))
+            batch.append(job)
+            if len(batch) >= batch_size:
+                for result in flush():
+                    yield result
+
+        for result in flush():
+            yield result
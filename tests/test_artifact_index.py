@@ -0,0 +1,82 @@
+import os
+import shutil
+import tempfile
+
+import requests
+import requests_mock
+from nose.tools import assert_equal, assert_false, assert_raises, assert_true
+
+from artifact_index import ArtifactIndex
+from http_client import ArtifactInfo, HTTPClient
+
+
+class TestArtifactIndex(object):
+    URL = 'https://storage.kernelci.org/mainline/master/v4.20/arm/multi_v7_defconfig/zImage'
+    ETAG = '"deadcoffee"'
+    LAST_MODIFIED = 'Mon, 02 Jul 2018 10:00:00 GMT'
+
+    def setup(self):
+        self.dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.dir, 'ctt', 'artifacts.sqlite')
+
+    def teardown(self):
+        shutil.rmtree(self.dir)
+
+    def test_store(self):
+        index = ArtifactIndex(self.path)
+        index.store(ArtifactInfo(self.URL, 42, self.LAST_MODIFIED, self.ETAG))
+        index.close()
+
+        index = ArtifactIndex(self.path)
+        found, info = index.lookup(self.URL)
+        assert_true(found)
+        assert_equal(42, info.size)
+        assert_equal(self.ETAG, info.etag)
+
+    def test_missing_expires(self):
+        index = ArtifactIndex(self.path, negative_ttl=3600)
+        index.store_missing(self.URL)
+        found, info = index.lookup(self.URL)
+        assert_false(found)
+
+        index = ArtifactIndex(self.path, negative_ttl=0)
+        assert_equal(None, index.lookup(self.URL))
+
+    @requests_mock.mock()
+    def test_probe_revalidate(self, mock):
+        mock.head(self.URL, headers={'Content-Length': '42',
+                                     'ETag': self.ETAG,
+                                     'Last-Modified': self.LAST_MODIFIED})
+
+        index = ArtifactIndex(self.path)
+        http = HTTPClient()
+        index.probe(http, self.URL)
+        assert_false('If-None-Match' in mock.last_request.headers)
+
+        mock.head(self.URL, status_code=304)
+        info = index.probe(http, self.URL)
+        assert_equal(self.ETAG, mock.last_request.headers['If-None-Match'])
+        assert_equal(self.LAST_MODIFIED,
+                     mock.last_request.headers['If-Modified-Since'])
+        assert_equal(42, info.size)
+
+    @requests_mock.mock()
+    def test_probe_missing(self, mock):
+        mock.head(self.URL, status_code=404)
+
+        index = ArtifactIndex(self.path)
+        http = HTTPClient()
+        assert_raises(requests.exceptions.HTTPError, index.probe, http,
+                      self.URL)
+        assert_raises(requests.exceptions.HTTPError, index.probe, http,
+                      self.URL)
+        assert_equal(1, mock.call_count)
+
+    @requests_mock.mock()
+    def test_probe_server_error_not_stored(self, mock):
+        mock.head(self.URL, status_code=500)
+
+        index = ArtifactIndex(self.path)
+        assert_raises(requests.exceptions.HTTPError, index.probe,
+                      HTTPClient(), self.URL)
+        assert_equal(None, index.lookup(self.URL))
@@ -0,0 +1,119 @@
+import os
+import shutil
+import tempfile
+
+from nose.tools import assert_equal, assert_false, assert_true
+
+from ci_state import RunJournal, TestedState
+from planner import JobSpec
+
+
+class TestTestedState(object):
+    COMBINATION = ('beaglebone-black', 'mainline', 'master',
+                   'multi_v7_defconfig', 'boot')
+
+    def setup(self):
+        self.dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.dir, 'ctt', 'tested.json')
+
+    def teardown(self):
+        shutil.rmtree(self.dir)
+
+    def test_new(self):
+        state = TestedState(self.path)
+        assert_true(state.is_new(*self.COMBINATION, 'v4.20'))
+
+    def test_record(self):
+        state = TestedState(self.path)
+        state.record(*self.COMBINATION, 'v4.20')
+        state.save()
+
+        state = TestedState(self.path)
+        assert_false(state.is_new(*self.COMBINATION, 'v4.20'))
+        assert_true(state.is_new(*self.COMBINATION, 'v4.21'))
+        assert_true(state.is_new('beaglebone-black', 'mainline', 'master',
+                                 'multi_v7_defconfig', 'usb', 'v4.20'))
+
+    def test_not_saved(self):
+        state = TestedState(self.path)
+        state.record(*self.COMBINATION, 'v4.20')
+
+        state = TestedState(self.path)
+        assert_true(state.is_new(*self.COMBINATION, 'v4.20'))
+
+
+class TestRunJournal(object):
+    SPEC = JobSpec('beaglebone-black', 'mainline', 'master',
+                   'multi_v7_defconfig', 'boot',
+                   'beaglebone-black--mainline--master--multi_v7_defconfig--'
+                   'boot')
+    OTHER_SPEC = SPEC._replace(test='usb', job_name='other')
+
+    def setup(self):
+        self.dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.dir, 'ctt', 'journal.jsonl')
+
+    def teardown(self):
+        shutil.rmtree(self.dir)
+
+    def test_resume(self):
+        journal = RunJournal(self.path)
+        journal.record(self.SPEC, 'v4.20')
+        # Not closed, as if the run died
+
+        journal = RunJournal(self.path, resume=True)
+        assert_true(journal.is_done(self.SPEC.job_name))
+        assert_false(journal.is_done(self.OTHER_SPEC.job_name))
+        journal.record(self.OTHER_SPEC, 'v4.20')
+        journal.close()
+
+        journal = RunJournal(self.path, resume=True)
+        assert_equal([e['job_name'] for e in journal.entries()],
+                     [self.SPEC.job_name, self.OTHER_SPEC.job_name])
+        assert_equal(journal.entries()[0]['release'], 'v4.20')
+        assert_equal(journal.entries()[0]['board'], 'beaglebone-black')
+        journal.close()
+
+    def test_start_over(self):
+        journal = RunJournal(self.path)
+        journal.record(self.SPEC, 'v4.20')
+        journal.close()
+
+        journal = RunJournal(self.path)
+        assert_false(journal.is_done(self.SPEC.job_name))
+        journal.close()
+
+    def test_truncated(self):
+        journal = RunJournal(self.path)
+        journal.record(self.SPEC, 'v4.20')
+        journal.close()
+        with open(self.path, 'a') as f:
+            f.write('{"job_name": "oth')
+
+        journal = RunJournal(self.path, resume=True)
+        assert_equal(len(journal.entries()), 1)
+        journal.record(self.OTHER_SPEC, 'v4.20')
+        journal.close()
+
+        journal = RunJournal(self.path, resume=True)
+        assert_equal(len(journal.entries()), 2)
+        journal.close()
+
+    def test_finished(self):
+        journal = RunJournal(self.path)
+        journal.record(self.SPEC, 'v4.20')
+        journal.finish()
+        journal.close()
+
+        journal = RunJournal(self.path, resume=True)
+        assert_false(journal.resumed)
+        assert_false(journal.is_done(self.SPEC.job_name))
+        assert_equal(journal.entries(), [])
+        journal.record(self.OTHER_SPEC, 'v4.20')
+        journal.close()
+
+        journal = RunJournal(self.path, resume=True)
+        assert_true(journal.resumed)
+        assert_equal([e['job_name'] for e in journal.entries()],
+                     [self.OTHER_SPEC.job_name])
+        journal.close()
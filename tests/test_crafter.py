@@ -0,0 +1,148 @@
+import os
+import shutil
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+
+from nose.tools import assert_equal, assert_in, assert_is
+from nose.tools import assert_not_in, assert_raises, assert_true
+
+from src.crafter import CraftingError, JobCrafter
+
+
+class TestJobCrafter(object):
+    TEMPLATES = ['custom_simple_job.jinja', 'generic_multinode_job.jinja',
+                 'generic_simple_job.jinja']
+
+    BOARDS = {
+        'beaglebone-black': {
+            'name': 'beaglebone-black',
+            'device_type': 'beaglebone-black',
+            'test_plan': 'boot',
+        },
+        'broken': {
+            'name': 'broken',
+            'device_type': 'broken',
+            'test_plan': 'foo',
+        },
+    }
+
+    ARTIFACTS = {
+        'kernel': 'http://example.org/zImage',
+        'dtb': 'http://example.org/am335x-boneblack.dtb',
+        'rootfs': 'http://example.org/rootfs.cpio.gz',
+    }
+
+    def setup(self):
+        self.dir = tempfile.mkdtemp()
+        self.cfg = {
+            'no_send': True,
+            'output_dir': self.dir,
+            'cache_dir': self.dir,
+        }
+
+    def teardown(self):
+        shutil.rmtree(self.dir)
+
+    def test_precompiled(self):
+        crafter = JobCrafter({}, self.cfg)
+        assert_equal(sorted(crafter._templates),
+                     [os.path.join('jobs_templates', t)
+                      for t in self.TEMPLATES])
+
+        path = os.path.join('jobs_templates', 'generic_simple_job.jinja')
+        assert_is(crafter.get_template_from_file(path),
+                  crafter._templates[path])
+
+    def test_bytecode_cache(self):
+        JobCrafter({}, self.cfg)
+        assert_equal(len(os.listdir(os.path.join(self.dir, 'jinja'))),
+                     len(self.TEMPLATES))
+
+    def test_no_cache(self):
+        self.cfg['no_cache'] = True
+        JobCrafter({}, self.cfg)
+        assert_true(not os.path.exists(os.path.join(self.dir, 'jinja')))
+
+    def test_context(self):
+        crafter = JobCrafter(self.BOARDS, self.cfg)
+        context = crafter.make_context('beaglebone-black', self.ARTIFACTS,
+                                       'boot', 'foo')
+        assert_equal(context['job_name'], 'foo--boot')
+        assert_equal(context['rootfs_type'], 'ramdisk')
+        assert_equal(context['modules'], '')
+
+        def change():
+            context['test'] = 'usb'
+        assert_raises(TypeError, change)
+
+    def test_invalid(self):
+        crafter = JobCrafter(self.BOARDS, self.cfg)
+        assert_raises(CraftingError, crafter.render, 'beaglebone-black',
+                      self.ARTIFACTS, 'foo')
+        assert_raises(CraftingError, crafter.render, 'broken',
+                      self.ARTIFACTS, 'boot')
+        assert_equal(crafter.make_jobs('broken', self.ARTIFACTS, 'boot'),
+                     None)
+
+    def test_no_leak(self):
+        crafter = JobCrafter(self.BOARDS, self.cfg)
+        artifacts = dict(self.ARTIFACTS, modules='http://example.org/m.tgz')
+        assert_in('modules', crafter.render('beaglebone-black', artifacts,
+                                            'boot', 'foo'))
+        assert_not_in('modules', crafter.render('beaglebone-black',
+                                                self.ARTIFACTS, 'boot',
+                                                'foo'))
+
+    def test_concurrent(self):
+        crafter = JobCrafter(self.BOARDS, self.cfg)
+        names = ['job-%d' % i for i in range(50)]
+
+        def render(name):
+            return crafter.render('beaglebone-black', self.ARTIFACTS, 'boot',
+                                  name)
+
+        with ThreadPoolExecutor(8) as pool:
+            jobs = list(pool.map(render, names))
+
+        for name, job in zip(names, jobs):
+            assert_equal(job, render(name))
+            assert_in('%s--boot' % name, job)
+
+    def test_render_many(self):
+        crafter = JobCrafter(self.BOARDS, self.cfg)
+        consumed = []
+
+        def specs():
+            for name in ['a', 'b', 'c', 'd']:
+                consumed.append(name)
+                test = 'foo' if name in ['b', 'c'] else 'boot'
+                yield ('beaglebone-black', self.ARTIFACTS, test, name)
+
+        jobs = crafter.render_many(specs())
+        job = next(jobs)
+        # The specs are only read as needed
+        assert_equal(consumed, ['a'])
+        assert_equal(job.name, 'a')
+        assert_equal(job.board, self.BOARDS['beaglebone-black'])
+        assert_equal(job.job, crafter.render(*job.spec))
+
+        # The jobs of unknown tests are left out
+        assert_equal([job.name for job in jobs], ['d'])
+
+    def test_validation(self):
+        crafter = JobCrafter(self.BOARDS, self.cfg)
+        path = os.path.join('jobs_templates', 'generic_simple_job.jinja')
+        template = crafter._templates[path]
+        crafter._templates[path] = crafter.jinja_env.from_string(
+                'job_name: {{ job_name }}\n')
+        assert_raises(CraftingError, crafter.render, 'beaglebone-black',
+                      self.ARTIFACTS, 'boot', 'foo')
+
+        # The verdict is cached, whatever the name of the job
+        crafter._templates[path] = template
+        assert_raises(CraftingError, crafter.render, 'beaglebone-black',
+                      self.ARTIFACTS, 'boot', 'foo')
+        assert_raises(CraftingError, crafter.render, 'beaglebone-black',
+                      self.ARTIFACTS, 'boot', 'bar')
+        artifacts = dict(self.ARTIFACTS, kernel='http://example.org/Image')
+        crafter.render('beaglebone-black', artifacts, 'boot', 'bar')
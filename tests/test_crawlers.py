@@ -3,8 +3,10 @@ import requests_mock
 import time
 from nose.tools import assert_equal, assert_raises
 
-from crawlers import FreeElectronsCrawler, KernelCICrawler
+from crawlers import CrawlerChain, FreeElectronsCrawler, KernelCICrawler
 from crawlers import RemoteAccessError, RemoteEmptyError
+from http_client import HTTPClient
+from release_cache import ReleaseCache
 
 
 class TestKernelCICrawler(object):
@@ -41,6 +43,45 @@ class TestKernelCICrawler(object):
                      crawler._get_latest_release(self.DEFAULT_TREE,
                                                  self.DEFAULT_BRANCH))
 
+    @requests_mock.mock()
+    def test_check_release_cached(self, mock):
+        url = self.RELEASE_URL % (self.DEFAULT_TREE, self.DEFAULT_BRANCH)
+        response = {
+            'result': [{'kernel': self.DEFAULT_RELEASE,
+                    'created_on': {'$date': time.time()*1000}}],
+        }
+        cfg = {
+            'api_token': self.DEFAULT_API_TOKEN,
+        }
+
+        mock.get(url, json=response)
+
+        cache = ReleaseCache()
+        for crawler in [KernelCICrawler(cfg, cache),
+                        KernelCICrawler(cfg, cache)]:
+            for arch in ['arm', 'arm64']:
+                crawler._get_base_url(self.DEFAULT_TREE, self.DEFAULT_BRANCH,
+                                      arch, self.DEFAULT_DEFCONFIG)
+
+        assert_equal(1, mock.call_count)
+        assert_equal({'hits': 3, 'misses': 1}, cache.stats())
+
+    @requests_mock.mock()
+    def test_check_release_not_cached_on_error(self, mock):
+        url = self.RELEASE_URL % (self.DEFAULT_TREE, self.DEFAULT_BRANCH)
+        cfg = {
+            'api_token': self.DEFAULT_API_TOKEN,
+        }
+
+        mock.get(url, status_code=404)
+
+        crawler = KernelCICrawler(cfg)
+        for i in range(2):
+            assert_raises(RemoteEmptyError, crawler._get_base_url,
+                          self.DEFAULT_TREE, self.DEFAULT_BRANCH,
+                          self.DEFAULT_ARCH, self.DEFAULT_DEFCONFIG)
+        assert_equal(2, mock.call_count)
+
     @requests_mock.mock()
     def test_check_release_error(self, mock):
         url = self.RELEASE_URL % (self.DEFAULT_TREE, self.DEFAULT_BRANCH)
@@ -110,6 +151,91 @@ class TestKernelCICrawler(object):
         assert_raises(RemoteEmptyError, crawler._get_latest_release,
                       self.DEFAULT_TREE, self.DEFAULT_BRANCH)
 
+    @requests_mock.mock()
+    def test_prefetch_releases(self, mock):
+        builds_url = 'https://api.kernelci.org/build'
+        # All the 4.14 builds are newer than the 4.9 ones
+        builds = [{'git_branch': 'linux-4.14.y', 'kernel': 'v4.14.%d' % i}
+                  for i in range(300, 0, -1)]
+        builds += [{'git_branch': 'linux-4.9.y', 'kernel': 'v4.9.%d' % i}
+                   for i in range(1000, 0, -1)]
+
+        def get_builds(request, context):
+            # Filters and pages the builds, sorted from the newest
+            matching = [b for b in builds
+                        if b['git_branch'] in request.qs['git_branch']]
+            skip = int(request.qs['skip'][0])
+            limit = int(request.qs['limit'][0])
+            return {'result': matching[skip:skip + limit]}
+
+        cfg = {
+            'api_token': self.DEFAULT_API_TOKEN,
+        }
+
+        mock.get(builds_url, json=get_builds)
+
+        crawler = KernelCICrawler(cfg)
+        crawler.prefetch_releases([('stable', 'linux-4.14.y'),
+                                   ('stable', 'linux-4.9.y')])
+        assert_equal(2, mock.call_count)
+        assert_equal(['linux-4.14.y', 'linux-4.9.y'],
+                     mock.request_history[0].qs['git_branch'])
+        assert_equal(['linux-4.9.y'],
+                     mock.request_history[1].qs['git_branch'])
+
+        # Each branch gets its newest build
+        assert_equal('v4.14.300', crawler._get_release('stable',
+                                                       'linux-4.14.y'))
+        assert_equal('v4.9.1000', crawler._get_release('stable',
+                                                       'linux-4.9.y'))
+        assert_equal(2, mock.call_count)
+
+    @requests_mock.mock()
+    def test_prefetch_releases_paging(self, mock):
+        builds_url = 'https://api.kernelci.org/build'
+        # Builds of other branches come first, and are not filtered out
+        builds = [{'git_branch': 'linux-4.4.y', 'kernel': 'v4.4.1'}] * 250
+        builds += [{'git_branch': 'linux-4.9.y', 'kernel': 'v4.9.2'},
+                   {'git_branch': 'linux-4.9.y', 'kernel': 'v4.9.1'}]
+
+        def get_builds(request, context):
+            skip = int(request.qs['skip'][0])
+            limit = int(request.qs['limit'][0])
+            return {'result': builds[skip:skip + limit]}
+
+        cfg = {
+            'api_token': self.DEFAULT_API_TOKEN,
+        }
+
+        mock.get(builds_url, json=get_builds)
+
+        crawler = KernelCICrawler(cfg)
+        crawler.prefetch_releases([('stable', 'linux-4.9.y')])
+        assert_equal(['0', '200'], [r.qs['skip'][0]
+                                    for r in mock.request_history])
+        assert_equal('v4.9.2', crawler._get_release('stable', 'linux-4.9.y'))
+        assert_equal(2, mock.call_count)
+
+    @requests_mock.mock()
+    def test_prefetch_releases_error(self, mock):
+        url = self.RELEASE_URL % (self.DEFAULT_TREE, self.DEFAULT_BRANCH)
+        response = {
+            'result': [{'kernel': self.DEFAULT_RELEASE,
+                    'created_on': {'$date': time.time()*1000}}],
+        }
+        cfg = {
+            'api_token': self.DEFAULT_API_TOKEN,
+        }
+
+        mock.get('https://api.kernelci.org/build', status_code=500)
+        mock.get(url, json=response)
+
+        crawler = KernelCICrawler(cfg)
+        crawler.prefetch_releases([(self.DEFAULT_TREE, self.DEFAULT_BRANCH)])
+        assert_equal(self.DEFAULT_RELEASE,
+                     crawler._get_release(self.DEFAULT_TREE,
+                                          self.DEFAULT_BRANCH))
+
     @requests_mock.mock()
     def test_check_release_url(self, mock):
         url = self.RELEASE_URL % (self.DEFAULT_TREE, self.DEFAULT_BRANCH)
@@ -169,10 +295,10 @@ class TestKernelCICrawler(object):
 
         mock.get(release_url, json=release_response,
                  request_headers=release_headers)
-        mock.get(config_url)
-        mock.get(kernel_url)
-        mock.get(modules_url)
-        mock.get(dtb_url)
+        mock.head(config_url)
+        mock.head(kernel_url)
+        mock.head(modules_url)
+        mock.head(dtb_url)
 
         crawler = KernelCICrawler(cfg)
         items = crawler.crawl(board, self.DEFAULT_TREE,
@@ -211,7 +337,7 @@ class TestKernelCICrawler(object):
 
         mock.get(release_url, json=release_response,
                  request_headers=release_headers)
-        mock.get(config_url, status_code=404)
+        mock.head(config_url, status_code=404)
 
         crawler = KernelCICrawler(cfg)
         assert_raises(RemoteEmptyError, crawler.crawl,
@@ -247,8 +373,8 @@ class TestKernelCICrawler(object):
 
         mock.get(release_url, json=release_response,
                  request_headers=release_headers)
-        mock.get(config_url)
-        mock.get(kernel_url, status_code=404)
+        mock.head(config_url)
+        mock.head(kernel_url, status_code=404)
 
         crawler = KernelCICrawler(cfg)
         assert_raises(RemoteEmptyError, crawler.crawl,
@@ -285,9 +411,9 @@ class TestKernelCICrawler(object):
 
         mock.get(release_url, json=release_response,
                  request_headers=release_headers)
-        mock.get(config_url)
-        mock.get(kernel_url)
-        mock.get(modules_url, status_code=404)
+        mock.head(config_url)
+        mock.head(kernel_url)
+        mock.head(modules_url, status_code=404)
 
         crawler = KernelCICrawler(cfg)
         assert_raises(RemoteEmptyError, crawler.crawl,
@@ -325,16 +451,102 @@ class TestKernelCICrawler(object):
 
         mock.get(release_url, json=release_response,
                  request_headers=release_headers)
-        mock.get(config_url)
-        mock.get(kernel_url)
-        mock.get(modules_url)
-        mock.get(dtb_url, status_code=404)
+        mock.head(config_url)
+        mock.head(kernel_url)
+        mock.head(modules_url)
+        mock.head(dtb_url, status_code=404)
 
         crawler = KernelCICrawler(cfg)
         assert_raises(RemoteEmptyError, crawler.crawl,
                       board, self.DEFAULT_TREE, self.DEFAULT_BRANCH,
                       self.DEFAULT_DEFCONFIG)
 
+    @requests_mock.mock()
+    def test_check_artifacts_concurrent(self, mock):
+        release_url = self.RELEASE_URL % (self.DEFAULT_TREE,
+                                          self.DEFAULT_BRANCH)
+        config_url = '%s/%s/%s/%s/%s/%s' % (self.BASE_URL,
+                                            self.DEFAULT_TREE,
+                                            self.DEFAULT_BRANCH,
+                                            self.DEFAULT_RELEASE,
+                                            self.DEFAULT_ARCH,
+                                            self.DEFAULT_DEFCONFIG)
+        kernel_url = '%s/%s' % (config_url, self.DEFAULT_IMAGE)
+        modules_url = '%s/%s' % (config_url, self.DEFAULT_MODULES)
+        dtb_url = '%s/dtbs/%s.dtb' % (config_url, self.DEFAULT_DTB)
+        release_response = {
+            'result': [{'kernel': self.DEFAULT_RELEASE,
+                    'created_on': {'$date': time.time()*1000}}],
+        }
+        board = {
+            'arch': self.DEFAULT_ARCH,
+            'dt': self.DEFAULT_DTB,
+            'name': 'test'
+        }
+        cfg = {
+            'api_token': self.DEFAULT_API_TOKEN,
+            'crawl_concurrency': '4',
+        }
+
+        mock.get(release_url, json=release_response)
+        mock.head(config_url)
+        mock.head(kernel_url)
+        mock.head(modules_url)
+        mock.head(dtb_url)
+
+        crawler = KernelCICrawler(cfg)
+        items = crawler.crawl(board, self.DEFAULT_TREE,
+                              self.DEFAULT_BRANCH,
+                              self.DEFAULT_DEFCONFIG)
+
+        assert_equal(kernel_url, items['kernel'])
+        assert_equal(dtb_url, items['dtb'])
+        assert_equal(modules_url, items['modules'])
+        assert_equal(5, mock.call_count)
+
+    @requests_mock.mock()
+    def test_check_artifacts_concurrent_error_order(self, mock):
+        release_url = self.RELEASE_URL % (self.DEFAULT_TREE,
+                                          self.DEFAULT_BRANCH)
+        config_url = '%s/%s/%s/%s/%s/%s' % (self.BASE_URL,
+                                            self.DEFAULT_TREE,
+                                            self.DEFAULT_BRANCH,
+                                            self.DEFAULT_RELEASE,
+                                            self.DEFAULT_ARCH,
+                                            self.DEFAULT_DEFCONFIG)
+        kernel_url = '%s/%s' % (config_url, self.DEFAULT_IMAGE)
+        modules_url = '%s/%s' % (config_url, self.DEFAULT_MODULES)
+        dtb_url = '%s/dtbs/%s.dtb' % (config_url, self.DEFAULT_DTB)
+        release_response = {
+            'result': [{'kernel': self.DEFAULT_RELEASE,
+                    'created_on': {'$date': time.time()*1000}}],
+        }
+        board = {
+            'arch': self.DEFAULT_ARCH,
+            'dt': self.DEFAULT_DTB,
+            'name': 'test'
+        }
+        cfg = {
+            'api_token': self.DEFAULT_API_TOKEN,
+            'crawl_concurrency': '4',
+        }
+
+        mock.get(release_url, json=release_response)
+        mock.head(config_url)
+        mock.head(kernel_url, status_code=404)
+        mock.head(modules_url, exc=requests.exceptions.ConnectTimeout)
+        mock.head(dtb_url, status_code=404)
+
+        crawler = KernelCICrawler(cfg, http=HTTPClient(retries=0))
+        assert_raises(RemoteEmptyError, crawler.crawl,
+                      board, self.DEFAULT_TREE, self.DEFAULT_BRANCH,
+                      self.DEFAULT_DEFCONFIG)
+
+        mock.head(kernel_url)
+        assert_raises(RemoteAccessError, crawler.crawl,
+                      board, self.DEFAULT_TREE, self.DEFAULT_BRANCH,
+                      self.DEFAULT_DEFCONFIG)
+
 
 class TestFECrawler(object):
     BASE_URL = 'http://lava.bootlin.com/downloads/builds/'
@@ -429,10 +641,10 @@ class TestFECrawler(object):
 
         mock.get(release_url, text=self.DEFAULT_RELEASE, headers={'last-modified':
                  time.strftime("%a, %d %b %Y %H:%M:%S GMT", time.gmtime())})
-        mock.get(config_url)
-        mock.get(kernel_url)
-        mock.get(modules_url)
-        mock.get(dtb_url)
+        mock.head(config_url)
+        mock.head(kernel_url)
+        mock.head(modules_url)
+        mock.head(dtb_url)
 
         crawler = FreeElectronsCrawler(cfg)
         items = crawler.crawl(board, self.DEFAULT_TREE,
@@ -465,7 +677,7 @@ class TestFECrawler(object):
 
         mock.get(release_url, text=self.DEFAULT_RELEASE, headers={'last-modified':
                  time.strftime("%a, %d %b %Y %H:%M:%S GMT", time.gmtime())})
-        mock.get(config_url, status_code=404)
+        mock.head(config_url, status_code=404)
 
         crawler = FreeElectronsCrawler(cfg)
         assert_raises(RemoteEmptyError, crawler.crawl,
@@ -495,8 +707,8 @@ class TestFECrawler(object):
 
         mock.get(release_url, text=self.DEFAULT_RELEASE, headers={'last-modified':
                  time.strftime("%a, %d %b %Y %H:%M:%S GMT", time.gmtime())})
-        mock.get(config_url)
-        mock.get(kernel_url, status_code=404)
+        mock.head(config_url)
+        mock.head(kernel_url, status_code=404)
 
         crawler = FreeElectronsCrawler(cfg)
         assert_raises(RemoteEmptyError, crawler.crawl,
@@ -527,9 +739,9 @@ class TestFECrawler(object):
 
         mock.get(release_url, text=self.DEFAULT_RELEASE, headers={'last-modified':
                  time.strftime("%a, %d %b %Y %H:%M:%S GMT", time.gmtime())})
-        mock.get(config_url)
-        mock.get(kernel_url)
-        mock.get(modules_url, status_code=404)
+        mock.head(config_url)
+        mock.head(kernel_url)
+        mock.head(modules_url, status_code=404)
 
         crawler = FreeElectronsCrawler(cfg)
         assert_raises(RemoteEmptyError, crawler.crawl,
@@ -561,12 +773,274 @@ class TestFECrawler(object):
 
         mock.get(release_url, text=self.DEFAULT_RELEASE, headers={'last-modified':
                  time.strftime("%a, %d %b %Y %H:%M:%S GMT", time.gmtime())})
-        mock.get(config_url)
-        mock.get(kernel_url)
-        mock.get(modules_url)
-        mock.get(dtb_url, status_code=404)
+        mock.head(config_url)
+        mock.head(kernel_url)
+        mock.head(modules_url)
+        mock.head(dtb_url, status_code=404)
+
+        crawler = FreeElectronsCrawler(cfg)
+        assert_raises(RemoteEmptyError, crawler.crawl,
+                      board, self.DEFAULT_TREE, self.DEFAULT_BRANCH,
+                      self.DEFAULT_DEFCONFIG)
+
+    @requests_mock.mock()
+    def test_check_artifacts_head_rejected(self, mock):
+        release_url = '%s/%s/%s/latest' % (self.BASE_URL,
+                                           self.DEFAULT_TREE,
+                                           self.DEFAULT_BRANCH)
+        config_url = '%s/%s/%s/%s/%s/%s' % (self.BASE_URL,
+                                            self.DEFAULT_TREE,
+                                            self.DEFAULT_BRANCH,
+                                            self.DEFAULT_RELEASE,
+                                            self.DEFAULT_ARCH,
+                                            self.DEFAULT_DEFCONFIG)
+        kernel_url = '%s/%s' % (config_url, self.DEFAULT_IMAGE)
+        modules_url = '%s/%s' % (config_url, self.DEFAULT_MODULES)
+        dtb_url = '%s/dtbs/%s.dtb' % (config_url, self.DEFAULT_DTB)
+        board = {
+            'arch': self.DEFAULT_ARCH,
+            'dt': self.DEFAULT_DTB,
+            'name': 'test'
+        }
+        cfg = {
+            'api_token': self.DEFAULT_API_TOKEN,
+        }
+        last_modified = 'Mon, 02 Jul 2018 10:00:00 GMT'
+
+        mock.get(release_url, text=self.DEFAULT_RELEASE, headers={'last-modified':
+                 time.strftime("%a, %d %b %Y %H:%M:%S GMT", time.gmtime())})
+        mock.head(config_url)
+        mock.head(kernel_url, status_code=405)
+        mock.get(kernel_url, status_code=206,
+                 request_headers={'Range': 'bytes=0-0'},
+                 headers={'Content-Range': 'bytes 0-0/4242',
+                          'Last-Modified': last_modified})
+        mock.head(modules_url, headers={'Content-Length': '1337'})
+        mock.head(dtb_url)
+
+        crawler = FreeElectronsCrawler(cfg)
+        items = crawler.crawl(board, self.DEFAULT_TREE,
+                              self.DEFAULT_BRANCH,
+                              self.DEFAULT_DEFCONFIG)
+
+        assert_equal(kernel_url, items['kernel'])
+        assert_equal(4242, crawler.get_artifact_info(kernel_url).size)
+        assert_equal(last_modified,
+                     crawler.get_artifact_info(kernel_url).last_modified)
+        assert_equal(1337, crawler.get_artifact_info(modules_url).size)
+
+    @requests_mock.mock()
+    def test_check_artifacts_head_rejected_missing(self, mock):
+        release_url = '%s/%s/%s/latest' % (self.BASE_URL,
+                                           self.DEFAULT_TREE,
+                                           self.DEFAULT_BRANCH)
+        config_url = '%s/%s/%s/%s/%s/%s' % (self.BASE_URL,
+                                            self.DEFAULT_TREE,
+                                            self.DEFAULT_BRANCH,
+                                            self.DEFAULT_RELEASE,
+                                            self.DEFAULT_ARCH,
+                                            self.DEFAULT_DEFCONFIG)
+        kernel_url = '%s/%s' % (config_url, self.DEFAULT_IMAGE)
+        board = {
+            'arch': self.DEFAULT_ARCH,
+            'dt': self.DEFAULT_DTB,
+            'name': 'test'
+        }
+        cfg = {
+            'api_token': self.DEFAULT_API_TOKEN,
+        }
+
+        mock.get(release_url, text=self.DEFAULT_RELEASE, headers={'last-modified':
+                 time.strftime("%a, %d %b %Y %H:%M:%S GMT", time.gmtime())})
+        mock.head(config_url)
+        mock.head(kernel_url, status_code=501)
+        mock.get(kernel_url, status_code=404)
 
         crawler = FreeElectronsCrawler(cfg)
         assert_raises(RemoteEmptyError, crawler.crawl,
                       board, self.DEFAULT_TREE, self.DEFAULT_BRANCH,
                       self.DEFAULT_DEFCONFIG)
+
+
+class FakeCrawler(object):
+    def __init__(self, result):
+        self.result = result
+        self.calls = 0
+
+    def crawl(self, board, tree, branch, defconfig):
+        self.calls += 1
+        if isinstance(self.result, Exception):
+            raise self.result
+        return self.result
+
+
+class MirrorCrawler(FakeCrawler):
+    pass
+
+
+class TestCrawlerChain(object):
+    ARGS = ({'name': 'test'}, 'mainline', 'master', 'test_defconfig')
+
+    def test_first_success(self):
+        first = FakeCrawler({'kernel': 'first'})
+        second = MirrorCrawler({'kernel': 'second'})
+
+        chain = CrawlerChain()
+        chain.add(second, 1)
+        chain.add(first, 0)
+
+        assert_equal({'kernel': 'first'}, chain.crawl(*self.ARGS))
+        assert_equal(1, first.calls)
+        assert_equal(0, second.calls)
+        assert_equal(1, chain.stats()['FakeCrawler']['served'])
+        assert_equal(0, chain.stats()['MirrorCrawler']['served'])
+
+    def test_fallback(self):
+        first = FakeCrawler(RemoteAccessError('down'))
+        second = MirrorCrawler({'kernel': 'second'})
+
+        chain = CrawlerChain()
+        chain.add(first, 0)
+        chain.add(second, 1)
+
+        assert_equal({'kernel': 'second'}, chain.crawl(*self.ARGS))
+        assert_equal(1, chain.stats()['FakeCrawler']['unreachable'])
+        assert_equal(1, chain.stats()['MirrorCrawler']['served'])
+
+    def test_nothing_found(self):
+        chain = CrawlerChain()
+        chain.add(FakeCrawler(RemoteEmptyError('empty')), 0)
+        chain.add(MirrorCrawler(RemoteEmptyError('empty')), 1)
+
+        assert_raises(RemoteEmptyError, chain.crawl, *self.ARGS)
+        assert_equal(1, chain.stats()['FakeCrawler']['empty'])
+        assert_equal(1, chain.stats()['MirrorCrawler']['empty'])
+
+    def test_race(self):
+        first = FakeCrawler(RemoteEmptyError('empty'))
+        second = MirrorCrawler({'kernel': 'second'})
+
+        chain = CrawlerChain(race=True)
+        chain.add(first, 0)
+        chain.add(second, 1)
+
+        assert_equal({'kernel': 'second'}, chain.crawl(*self.ARGS))
+        assert_equal(1, first.calls)
+        assert_equal(1, second.calls)
+        assert_equal(1, chain.stats()['MirrorCrawler']['served'])
+
+    def test_race_priority(self):
+        first = FakeCrawler({'kernel': 'first'})
+        second = MirrorCrawler({'kernel': 'second'})
+
+        chain = CrawlerChain(race=True)
+        chain.add(first, 0)
+        chain.add(second, 1)
+
+        assert_equal({'kernel': 'first'}, chain.crawl(*self.ARGS))
+        assert_equal(1, chain.stats()['FakeCrawler']['served'])
+
+
+class TestFECrawlerListing(object):
+    BASE_URL = 'http://lava.bootlin.com/downloads/builds/'
+    DEFAULT_BRANCH = 'master'
+    DEFAULT_DEFCONFIG = 'defconfig'
+    DEFAULT_RELEASE = 'version-deadcoffee-4.2'
+    DEFAULT_TREE = 'mainline'
+    BUILD_INDEX = '''<html><body><h1>Index of /builds</h1>
+<a href="?C=N;O=D">Name</a>
+<a href="/downloads/builds/">Parent Directory</a>
+<a href="../">../</a>
+<a href="Image">Image</a>
+<a href="dtbs/">dtbs/</a>
+<a href="modules.tar.xz">modules.tar.xz</a>
+</body></html>'''
+    DTBS_INDEX = '''<html><body>
+<a href="../">../</a>
+<a href="armada-3720-db.dtb">armada-3720-db.dtb</a>
+<a href="armada-3720-espressobin.dtb">armada-3720-espressobin.dtb</a>
+</body></html>'''
+
+    def setup(self):
+        self.config_url = '%s/%s/%s/%s/%s/%s' % (self.BASE_URL,
+                                                 self.DEFAULT_TREE,
+                                                 self.DEFAULT_BRANCH,
+                                                 self.DEFAULT_RELEASE,
+                                                 'arm64',
+                                                 self.DEFAULT_DEFCONFIG)
+        self.cfg = {
+            'crawl_mode': 'listing',
+        }
+
+    def register(self, mock):
+        release_url = '%s/%s/%s/latest' % (self.BASE_URL,
+                                           self.DEFAULT_TREE,
+                                           self.DEFAULT_BRANCH)
+        mock.get(release_url, text=self.DEFAULT_RELEASE, headers={'last-modified':
+                 time.strftime("%a, %d %b %Y %H:%M:%S GMT", time.gmtime())})
+        mock.get('%s/' % self.config_url, text=self.BUILD_INDEX)
+        mock.get('%s/dtbs/marvell/' % self.config_url, text=self.DTBS_INDEX)
+
+    def board(self, dt):
+        return {
+            'arch': 'arm64',
+            'dt': 'marvell/%s' % dt,
+            'name': dt,
+        }
+
+    @requests_mock.mock()
+    def test_shared_listing(self, mock):
+        self.register(mock)
+
+        crawler = FreeElectronsCrawler(self.cfg)
+        for dt in ['armada-3720-db', 'armada-3720-espressobin']:
+            items = crawler.crawl(self.board(dt), self.DEFAULT_TREE,
+                                  self.DEFAULT_BRANCH, self.DEFAULT_DEFCONFIG)
+            assert_equal('%s/Image' % self.config_url, items['kernel'])
+            assert_equal('%s/dtbs/marvell/%s.dtb' % (self.config_url, dt),
+                         items['dtb'])
+            assert_equal('%s/modules.tar.xz' % self.config_url,
+                         items['modules'])
+
+        # The release, and the two listings
+        assert_equal(3, mock.call_count)
+
+    @requests_mock.mock()
+    def test_missing_dtb(self, mock):
+        self.register(mock)
+
+        crawler = FreeElectronsCrawler(self.cfg)
+        assert_raises(RemoteEmptyError, crawler.crawl,
+                      self.board('armada-8040-db'), self.DEFAULT_TREE,
+                      self.DEFAULT_BRANCH, self.DEFAULT_DEFCONFIG)
+
+    @requests_mock.mock()
+    def test_missing_dtb_directory(self, mock):
+        self.register(mock)
+        mock.get('%s/dtbs/marvell/' % self.config_url, status_code=404)
+
+        crawler = FreeElectronsCrawler(self.cfg)
+        assert_raises(RemoteEmptyError, crawler.crawl,
+                      self.board('armada-3720-db'), self.DEFAULT_TREE,
+                      self.DEFAULT_BRANCH, self.DEFAULT_DEFCONFIG)
+
+    @requests_mock.mock()
+    def test_missing_build(self, mock):
+        self.register(mock)
+        mock.get('%s/' % self.config_url, status_code=404)
+
+        crawler = FreeElectronsCrawler(self.cfg)
+        assert_raises(RemoteEmptyError, crawler.crawl,
+                      self.board('armada-3720-db'), self.DEFAULT_TREE,
+                      self.DEFAULT_BRANCH, self.DEFAULT_DEFCONFIG)
+
+    @requests_mock.mock()
+    def test_unreachable(self, mock):
+        self.register(mock)
+        mock.get('%s/' % self.config_url,
+                 exc=requests.exceptions.ConnectionError)
+
+        crawler = FreeElectronsCrawler(self.cfg, http=HTTPClient(retries=0))
+        assert_raises(RemoteAccessError, crawler.crawl,
+                      self.board('armada-3720-db'), self.DEFAULT_TREE,
+                      self.DEFAULT_BRANCH, self.DEFAULT_DEFCONFIG)
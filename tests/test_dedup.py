@@ -0,0 +1,90 @@
+import os
+import shutil
+import tempfile
+
+from nose.tools import assert_equal, assert_not_equal
+
+from crafter import RenderedJob
+from dedup import JobDeduplicator, get_job_hash
+
+
+class TestJobHash(object):
+    JOB = 'device_type: beaglebone-black\njob_name: foo\ntimeouts:\n' \
+          '  job:\n    minutes: 10\n'
+
+    def test_formatting(self):
+        job = '# A comment\ntimeouts: {job: {minutes: 10}}\n' \
+              'job_name: bar\ndevice_type: beaglebone-black\n'
+        assert_equal(get_job_hash(self.JOB), get_job_hash(job))
+
+    def test_ignored_fields(self):
+        job = self.JOB.replace('foo', 'bar')
+        assert_not_equal(get_job_hash(self.JOB, ()), get_job_hash(job, ()))
+        job = self.JOB.replace('10', '20')
+        assert_not_equal(get_job_hash(self.JOB), get_job_hash(job))
+
+    def test_invalid(self):
+        assert_equal(get_job_hash('foo: [bar'), get_job_hash('foo: [bar'))
+        assert_not_equal(get_job_hash('foo: [bar'), get_job_hash('foo: [baz'))
+
+
+class TestJobDeduplicator(object):
+    def setup(self):
+        self.dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.dir, 'submitted.json')
+
+    def teardown(self):
+        shutil.rmtree(self.dir)
+
+    def get_jobs(self, *jobs):
+        return [RenderedJob(None, {}, name, 'job_name: %s\nkernel: %s\n' %
+                            (name, kernel)) for name, kernel in jobs]
+
+    def test_run(self):
+        dedup = JobDeduplicator()
+        jobs = self.get_jobs(('a', 'zImage'), ('b', 'zImage'),
+                             ('c', 'Image'))
+        assert_equal([j.name for j in dedup.filter(jobs)], ['a', 'c'])
+        assert_equal(dedup.get_dropped(), [('b', 'same as a')])
+
+    def test_discard(self):
+        dedup = JobDeduplicator()
+        jobs = self.get_jobs(('a', 'zImage'), ('b', 'zImage'))
+        for job in dedup.filter(jobs[:1]):
+            # It couldn't be sent
+            dedup.discard(job)
+        assert_equal([j.name for j in dedup.filter(jobs[1:])], ['b'])
+
+    def test_window(self):
+        dedup = JobDeduplicator(window=3600, path=self.path)
+        for job in dedup.filter(self.get_jobs(('a', 'zImage'))):
+            dedup.record(job)
+        dedup.save()
+
+        dedup = JobDeduplicator(window=3600, path=self.path)
+        jobs = self.get_jobs(('b', 'zImage'), ('c', 'Image'))
+        assert_equal([j.name for j in dedup.filter(jobs)], ['c'])
+        assert_equal(dedup.get_dropped()[0][0], 'b')
+
+        # Without a window, previous runs are ignored
+        dedup = JobDeduplicator(path=self.path)
+        assert_equal(len(list(dedup.filter(jobs))), 2)
+
+    def test_not_sent(self):
+        dedup = JobDeduplicator(window=3600, path=self.path)
+        list(dedup.filter(self.get_jobs(('a', 'zImage'))))
+        dedup.save()
+
+        dedup = JobDeduplicator(window=3600, path=self.path)
+        jobs = self.get_jobs(('b', 'zImage'))
+        assert_equal(len(list(dedup.filter(jobs))), 1)
+
+    def test_record_unfiltered(self):
+        # Jobs sent from the outbox don't go through the filter
+        dedup = JobDeduplicator(window=3600, path=self.path)
+        dedup.record(self.get_jobs(('a', 'zImage'))[0])
+        dedup.save()
+
+        dedup = JobDeduplicator(window=3600, path=self.path)
+        jobs = self.get_jobs(('b', 'zImage'))
+        assert_equal(list(dedup.filter(jobs)), [])
@@ -0,0 +1,76 @@
+import logging
+import threading
+import time
+
+from nose.tools import assert_equal, assert_true
+
+from executor import MatrixExecutor
+
+
+class ListHandler(logging.Handler):
+    def __init__(self):
+        super(ListHandler, self).__init__()
+        self.messages = []
+
+    def emit(self, record):
+        self.messages.append(record.getMessage())
+
+
+class TestMatrixExecutor(object):
+    ITEMS = ['a', 'b', 'c', 'd']
+
+    def setup(self):
+        self.handler = ListHandler()
+        logging.getLogger().addHandler(self.handler)
+
+    def teardown(self):
+        logging.getLogger().removeHandler(self.handler)
+
+    def test_results_order(self):
+        def work(item):
+            # The first items are the slowest ones
+            time.sleep(0.01 * (len(self.ITEMS) - self.ITEMS.index(item)))
+            return item.upper()
+
+        executor = MatrixExecutor(4)
+        assert_equal(['A', 'B', 'C', 'D'], executor.run(self.ITEMS, work))
+
+    def test_failure_isolated(self):
+        def work(item):
+            if item == 'b':
+                raise Exception('failure')
+            return item
+
+        executor = MatrixExecutor(2)
+        assert_equal(['a', None, 'c', 'd'], executor.run(self.ITEMS, work))
+
+    def test_logs_grouped(self):
+        def work(item):
+            logging.warning('%s 1' % item)
+            time.sleep(0.01 * (len(self.ITEMS) - self.ITEMS.index(item)))
+            logging.warning('%s 2' % item)
+
+        executor = MatrixExecutor(4)
+        executor.run(self.ITEMS, work)
+
+        expected = []
+        for item in self.ITEMS:
+            expected += ['%s 1' % item, '%s 2' % item]
+        assert_equal(expected, self.handler.messages)
+
+    def test_stage_limit(self):
+        lock = threading.Lock()
+        state = {'current': 0, 'max': 0}
+
+        def work(item):
+            with executor.stage('submit'):
+                with lock:
+                    state['current'] += 1
+                    state['max'] = max(state['max'], state['current'])
+                time.sleep(0.01)
+                with lock:
+                    state['current'] -= 1
+
+        executor = MatrixExecutor(4, {'submit': 2})
+        executor.run(self.ITEMS, work)
+        assert_true(state['max'] <= 2)
@@ -0,0 +1,33 @@
+import json
+import os
+import shutil
+import tempfile
+
+from nose.tools import assert_equal, assert_raises
+
+from fileutils import write_json_atomically
+
+
+class TestWriteJsonAtomically(object):
+    def setup(self):
+        self.dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.dir, 'ctt', 'data.json')
+
+    def teardown(self):
+        shutil.rmtree(self.dir)
+
+    def test_write(self):
+        write_json_atomically(self.path, {'a': 1}, '.data-')
+        write_json_atomically(self.path, {'b': 2}, '.data-')
+        with open(self.path) as f:
+            assert_equal(json.load(f), {'b': 2})
+        assert_equal(os.listdir(os.path.dirname(self.path)), ['data.json'])
+
+    def test_error(self):
+        write_json_atomically(self.path, {'a': 1}, '.data-')
+        assert_raises(TypeError, write_json_atomically, self.path,
+                      {'a': object()}, '.data-')
+        # The previous file is left untouched
+        with open(self.path) as f:
+            assert_equal(json.load(f), {'a': 1})
+        assert_equal(os.listdir(os.path.dirname(self.path)), ['data.json'])
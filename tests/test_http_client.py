@@ -0,0 +1,169 @@
+import time
+
+import requests
+import requests_mock
+from nose.tools import assert_equal, assert_raises
+
+from http_client import CircuitOpenError, HostHealth, HTTPClient
+from http_client import RequestBudgetError
+
+
+class TestHTTPClient(object):
+    URL = 'http://lava.bootlin.com/downloads/rootfs/rootfs_armv7.cpio.gz'
+
+    @requests_mock.mock()
+    def test_budget(self, mock):
+        mock.get(self.URL)
+
+        client = HTTPClient(budget=2)
+        client.get(self.URL)
+        client.get(self.URL)
+        assert_raises(RequestBudgetError, client.get, self.URL)
+        assert_raises(requests.exceptions.ConnectionError, client.head,
+                      self.URL)
+        assert_equal(2, mock.call_count)
+        assert_equal(2, client.get_requests_count())
+
+    @requests_mock.mock()
+    def test_timeouts(self, mock):
+        mock.get(self.URL)
+
+        client = HTTPClient(connect_timeout=3, read_timeout=7)
+        client.get(self.URL)
+        client.get(self.URL, timeout=1)
+
+        assert_equal((3, 7), mock.request_history[0].timeout)
+        assert_equal(1, mock.request_history[1].timeout)
+
+    def test_from_config(self):
+        cfg = {
+            'http_connect_timeout': '2.5',
+            'http_request_budget': '1',
+        }
+
+        client = HTTPClient.from_config(cfg)
+        assert_equal((2.5, 60), client._timeout)
+        assert_equal(1, client._budget)
+
+    @requests_mock.mock()
+    def test_probe(self, mock):
+        mock.head(self.URL, headers={'Content-Length': '42',
+                                     'ETag': '"deadcoffee"'})
+
+        info = HTTPClient().probe(self.URL)
+        assert_equal(42, info.size)
+        assert_equal('"deadcoffee"', info.etag)
+        assert_equal('HEAD', mock.last_request.method)
+
+    @requests_mock.mock()
+    def test_probe_missing(self, mock):
+        mock.head(self.URL, status_code=404)
+
+        assert_raises(requests.exceptions.HTTPError, HTTPClient().probe,
+                      self.URL)
+
+    @requests_mock.mock()
+    def test_retry(self, mock):
+        mock.get(self.URL, [{'exc': requests.exceptions.ConnectTimeout},
+                            {'status_code': 503},
+                            {'text': 'ok'}])
+
+        client = HTTPClient(retries=2, backoff=0)
+        assert_equal('ok', client.get(self.URL).text)
+        assert_equal(3, mock.call_count)
+
+    @requests_mock.mock()
+    def test_retry_exhausted(self, mock):
+        mock.get(self.URL, exc=requests.exceptions.ConnectionError)
+
+        client = HTTPClient(retries=1, backoff=0)
+        assert_raises(requests.exceptions.ConnectionError, client.get,
+                      self.URL)
+        assert_equal(2, mock.call_count)
+
+    @requests_mock.mock()
+    def test_no_retry_on_client_error(self, mock):
+        mock.get(self.URL, status_code=404)
+
+        client = HTTPClient(retries=2, backoff=0)
+        assert_equal(404, client.get(self.URL).status_code)
+        assert_equal(1, mock.call_count)
+
+    @requests_mock.mock()
+    def test_circuit_open(self, mock):
+        mock.get(self.URL, exc=requests.exceptions.ConnectionError)
+        other_url = 'https://storage.kernelci.org/'
+        mock.get(other_url)
+
+        health = HostHealth(max_failures=2, reset_timeout=3600)
+        client = HTTPClient(retries=0, health=health)
+        for i in range(2):
+            assert_raises(requests.exceptions.ConnectionError, client.get,
+                          self.URL)
+        assert_raises(CircuitOpenError, client.get, self.URL)
+        assert_equal(2, mock.call_count)
+
+        # Other hosts are not affected
+        client.get(other_url)
+        assert_equal(3, mock.call_count)
+
+    @requests_mock.mock()
+    def test_circuit_half_open(self, mock):
+        mock.get(self.URL, [{'exc': requests.exceptions.ConnectionError},
+                            {'exc': requests.exceptions.ConnectionError},
+                            {'text': 'ok'}])
+
+        health = HostHealth(max_failures=1, reset_timeout=0.05)
+        client = HTTPClient(retries=0, health=health)
+        assert_raises(requests.exceptions.ConnectionError, client.get,
+                      self.URL)
+        assert_raises(CircuitOpenError, client.get, self.URL)
+
+        # The probe fails, and the circuit opens again
+        time.sleep(0.05)
+        assert_raises(requests.exceptions.ConnectionError, client.get,
+                      self.URL)
+        assert_raises(CircuitOpenError, client.get, self.URL)
+
+        time.sleep(0.05)
+        assert_equal('ok', client.get(self.URL).text)
+        assert_equal('ok', client.get(self.URL).text)
+        assert_equal(4, mock.call_count)
+
+    @requests_mock.mock()
+    def test_circuit_probe_error(self, mock):
+        mock.get(self.URL, [{'exc': requests.exceptions.ConnectionError},
+                            {'exc': requests.exceptions.TooManyRedirects},
+                            {'text': 'ok'}])
+
+        health = HostHealth(max_failures=1, reset_timeout=0.05)
+        client = HTTPClient(retries=0, health=health)
+        assert_raises(requests.exceptions.ConnectionError, client.get,
+                      self.URL)
+
+        # Any error of the probe opens the circuit again, for a while only
+        time.sleep(0.05)
+        assert_raises(requests.exceptions.TooManyRedirects, client.get,
+                      self.URL)
+        assert_raises(CircuitOpenError, client.get, self.URL)
+
+        time.sleep(0.05)
+        assert_equal('ok', client.get(self.URL).text)
+
+    @requests_mock.mock()
+    def test_circuit_budget(self, mock):
+        mock.get(self.URL, [{'exc': requests.exceptions.ConnectionError},
+                            {'text': 'ok'}])
+
+        health = HostHealth(max_failures=1, reset_timeout=0.05)
+        assert_raises(requests.exceptions.ConnectionError,
+                      HTTPClient(retries=0, health=health, budget=1).get,
+                      self.URL)
+
+        # A client out of budget doesn't start a probe it can't finish
+        time.sleep(0.05)
+        assert_raises(RequestBudgetError,
+                      HTTPClient(retries=0, health=health, budget=0).get,
+                      self.URL)
+        assert_equal('ok', HTTPClient(retries=0, health=health).get(
+                self.URL).text)
@@ -0,0 +1,98 @@
+import copy
+
+from nose.tools import assert_raises
+
+from job_schema import InvalidJobError, check_job, validate
+
+
+class TestJobSchema(object):
+    JOB = {
+        'device_type': 'beaglebone-black',
+        'job_name': 'foo--boot',
+        'timeouts': {
+            'job': {'minutes': 10},
+            'actions': {'power-off': {'seconds': 25}},
+        },
+        'priority': 'high',
+        'visibility': 'public',
+        'actions': [
+            {'deploy': {'to': 'tftp', 'os': 'oe'}},
+            {'boot': {'method': 'u-boot', 'timeout': {'minutes': 3}}},
+            {'test': {'definitions': [{
+                'repository': 'git://example.org/tests.git',
+                'from': 'git',
+                'path': 'tests/generic.yaml',
+                'name': 'custom-tests',
+            }]}},
+        ],
+    }
+
+    def get_multinode_job(self):
+        job = copy.deepcopy(self.JOB)
+        del job['device_type']
+        job['protocols'] = {'lava-multinode': {'roles': {
+            'board': {'device_type': 'beaglebone-black', 'count': 1},
+            'laptop': {'device_type': 'dummy-ssh', 'count': 1},
+        }}}
+        for action in job['actions']:
+            list(action.values())[0]['role'] = ['board']
+        return job
+
+    def assert_invalid(self, change, job=None):
+        job = copy.deepcopy(job or self.JOB)
+        change(job)
+        assert_raises(InvalidJobError, check_job, job)
+
+    def test_valid(self):
+        check_job(self.JOB)
+        check_job(self.get_multinode_job())
+
+    def test_required(self):
+        for key in ['device_type', 'job_name', 'timeouts', 'actions']:
+            self.assert_invalid(lambda job: job.pop(key))
+
+    def test_timeouts(self):
+        def no_job_timeout(job):
+            del job['timeouts']['job']
+
+        def empty_timeout(job):
+            job['timeouts']['job']['minutes'] = None
+
+        def bad_unit(job):
+            job['timeouts']['actions']['power-off'] = {'secs': 25}
+
+        for change in [no_job_timeout, empty_timeout, bad_unit]:
+            self.assert_invalid(change)
+
+    def test_actions(self):
+        def unknown(job):
+            job['actions'].append({'reboot': {}})
+
+        def missing_key(job):
+            del job['actions'][0]['deploy']['to']
+
+        def no_definitions(job):
+            del job['actions'][2]['test']['definitions']
+
+        def bad_definition(job):
+            del job['actions'][2]['test']['definitions'][0]['from']
+
+        for change in [unknown, missing_key, no_definitions, bad_definition]:
+            self.assert_invalid(change)
+
+    def test_multinode(self):
+        def no_role(job):
+            del job['actions'][0]['deploy']['role']
+
+        def unknown_role(job):
+            job['actions'][0]['deploy']['role'] = ['server']
+
+        def no_count(job):
+            del job['protocols']['lava-multinode']['roles']['board']['count']
+
+        for change in [no_role, unknown_role, no_count]:
+            self.assert_invalid(change, self.get_multinode_job())
+
+    def test_yaml(self):
+        assert_raises(InvalidJobError, validate, 'job_name: [foo')
+        assert_raises(InvalidJobError, validate, '- foo')
@@ -0,0 +1,76 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from xmlrpc.server import SimpleXMLRPCRequestHandler, SimpleXMLRPCServer
+
+from nose.tools import assert_equal, assert_true
+
+from lava_client import get_server_proxy
+
+
+class _RequestHandler(SimpleXMLRPCRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    connections = set()
+    gzipped = []
+
+    def setup(self):
+        super(_RequestHandler, self).setup()
+        self.connections.add(self.client_address)
+
+    def decode_request_content(self, data):
+        self.gzipped.append(
+                self.headers.get('content-encoding') == 'gzip')
+        return super(_RequestHandler, self).decode_request_content(data)
+
+
+class TestLavaClient(object):
+    def setup(self):
+        _RequestHandler.connections.clear()
+        del _RequestHandler.gzipped[:]
+        self.server = SimpleXMLRPCServer(('127.0.0.1', 0), _RequestHandler,
+                                         logRequests=False)
+        self.server.register_function(lambda x: x, 'echo')
+        # One thread per connection, so that several can be kept alive
+        self.server.process_request = self.process_request
+        self.url = 'http://127.0.0.1:%d/RPC2' % self.server.server_address[1]
+        self.thread = threading.Thread(target=self.server.serve_forever,
+                                       daemon=True)
+        self.thread.start()
+
+    def process_request(self, request, client_address):
+        def handle():
+            self.server.finish_request(request, client_address)
+            self.server.shutdown_request(request)
+        threading.Thread(target=handle, daemon=True).start()
+
+    def teardown(self):
+        self.server.shutdown()
+        self.server.server_close()
+        self.thread.join()
+
+    def test_keep_alive(self):
+        proxy = get_server_proxy(self.url)
+        for i in range(10):
+            assert_equal(proxy.echo(i), i)
+        proxy('close')()
+        assert_equal(len(_RequestHandler.connections), 1)
+
+    def test_threads(self):
+        proxy = get_server_proxy(self.url, pool_size=3)
+        with ThreadPoolExecutor(8) as pool:
+            results = list(pool.map(proxy.echo, range(100)))
+        proxy('close')()
+        assert_equal(results, list(range(100)))
+        assert_true(len(_RequestHandler.connections) <= 3)
+
+    def test_no_gzip(self):
+        proxy = get_server_proxy(self.url)
+        assert_equal(proxy.echo('x' * 10000), 'x' * 10000)
+        proxy('close')()
+        assert_equal(_RequestHandler.gzipped, [False])
+
+    def test_gzip(self):
+        proxy = get_server_proxy(self.url, gzip_requests=True)
+        assert_equal(proxy.echo('x' * 10000), 'x' * 10000)
+        assert_equal(proxy.echo('x'), 'x')
+        proxy('close')()
+        assert_equal(_RequestHandler.gzipped, [True, False])
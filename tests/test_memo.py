@@ -0,0 +1,44 @@
+import threading
+import time
+
+from nose.tools import assert_equal, assert_raises
+
+from memo import Memoizer
+
+
+class TestMemoizer(object):
+    def test_get(self):
+        memo = Memoizer()
+        calls = []
+
+        def fetch():
+            calls.append(None)
+            time.sleep(0.01)
+            return 'value'
+
+        threads = [threading.Thread(target=memo.get, args=('key', fetch))
+                   for i in range(5)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        assert_equal(memo.get('key', fetch), 'value')
+        assert_equal(len(calls), 1)
+        assert_equal(memo.stats(), {'hits': 5, 'misses': 1})
+
+    def test_ttl(self):
+        memo = Memoizer(ttl=0.01)
+        assert_equal(memo.get('key', lambda: 1), 1)
+        assert_equal(memo.get('key', lambda: 2), 1)
+        time.sleep(0.01)
+        assert_equal(memo.get('key', lambda: 3), 3)
+
+    def test_error(self):
+        memo = Memoizer()
+
+        def fetch():
+            raise ValueError()
+
+        assert_raises(ValueError, memo.get, 'key', fetch)
+        assert_equal(memo.get('key', lambda: 1), 1)
@@ -0,0 +1,114 @@
+import json
+import os
+import shutil
+import tempfile
+import time
+
+from nose.tools import assert_equal
+
+from crafter import RenderedJob
+from outbox import Outbox
+from writers import UnavailableError, Writer
+
+
+class FlakyWriter(Writer):
+    """
+    A writer that can't save anything for its first `failures` calls.
+    """
+
+    def __init__(self, outbox, failures=0):
+        super(FlakyWriter, self).__init__({}, outbox)
+        self.failures = failures
+        self.written = []
+
+    def write(self, board, name, job):
+        if self.failures:
+            self.failures -= 1
+            raise UnavailableError('LAVA device is offline')
+
+        self.written.append(name)
+        return ['sent/%s' % name]
+
+
+class TestOutbox(object):
+    def setup(self):
+        self.dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.dir, 'outbox')
+
+    def teardown(self):
+        shutil.rmtree(self.dir)
+
+    def get_job(self, name, content='job'):
+        return RenderedJob(None, {'device_type': 'foo'}, name, content)
+
+    def test_put(self):
+        outbox = Outbox(self.path)
+        outbox.put(self.get_job('a', 'first'))
+        outbox.put(self.get_job('b'))
+        outbox.put(self.get_job('a', 'second'))
+
+        jobs = outbox.get_jobs()
+        assert_equal(sorted(job.name for job in jobs), ['a', 'b'])
+        assert_equal([job.job for job in jobs if job.name == 'a'], ['second'])
+        assert_equal(jobs[0].board, {'device_type': 'foo'})
+
+        with open(os.path.join(self.path, 'a.json')) as f:
+            assert_equal(json.load(f)['attempts'], 1)
+
+        outbox.remove('a')
+        assert_equal([job.name for job in outbox.get_jobs()], ['b'])
+
+    def test_spec(self):
+        outbox = Outbox(self.path)
+        spec = ('beaglebone-black', {'release': 'v4.20'}, 'boot', 'a')
+        outbox.put(RenderedJob(spec, {'device_type': 'foo'}, 'a', 'job'))
+        outbox.put(self.get_job('b'))
+
+        specs = dict((job.name, job.spec) for job in outbox.get_jobs())
+        assert_equal(specs, {'a': spec, 'b': None})
+
+    def test_sent_later(self):
+        outbox = Outbox(self.path)
+        outbox.put(self.get_job('a'))
+        outbox.put(self.get_job('b'))
+
+        # Sending a job again the usual way drops it from the outbox
+        writer = FlakyWriter(outbox)
+        list(writer.write_many([self.get_job('a')]))
+        assert_equal([job.name for job in outbox.get_jobs()], ['b'])
+
+    def test_expire(self):
+        outbox = Outbox(self.path, ttl=60)
+        outbox.put(self.get_job('a'))
+        outbox.put(self.get_job('b'))
+
+        path = os.path.join(self.path, 'a.json')
+        with open(path) as f:
+            entry = json.load(f)
+        entry['spooled_on'] = time.time() - 120
+        with open(path, 'w') as f:
+            json.dump(entry, f)
+
+        assert_equal([job.name for job in outbox.get_jobs()], ['b'])
+        assert_equal(os.listdir(self.path), ['b.json'])
+
+    def test_flush(self):
+        outbox = Outbox(self.path)
+        for name in ['a', 'b', 'c']:
+            outbox.put(self.get_job(name))
+
+        # The first two attempts fail, and the jobs go back to the outbox
+        writer = FlakyWriter(outbox, failures=2)
+        sent, left = outbox.flush(writer, retries=1, backoff=0)
+        assert_equal(sorted(job.name for job in sent), ['a', 'b', 'c'])
+        assert_equal(left, 0)
+        assert_equal(sorted(writer.written), ['a', 'b', 'c'])
+        assert_equal(outbox.get_jobs(), [])
+
+    def test_flush_gives_up(self):
+        outbox = Outbox(self.path)
+        outbox.put(self.get_job('a'))
+
+        writer = FlakyWriter(outbox, failures=10)
+        assert_equal(outbox.flush(writer, retries=2, backoff=0), ([], 1))
+        assert_equal(writer.failures, 7)
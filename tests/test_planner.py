@@ -0,0 +1,108 @@
+from nose.tools import assert_equal, assert_true
+
+from planner import group_by_board, make_plan, shard, summarize
+
+
+class TestPlanner(object):
+    MAINLINE = {'tree': 'mainline', 'branch': 'master',
+                'defconfig': 'multi_v7_defconfig'}
+    STABLE = {'tree': 'stable', 'branch': 'linux-4.14.y',
+              'defconfig': 'multi_v7_defconfig'}
+    NEXT = {'tree': 'next', 'branch': 'master',
+            'defconfig': 'multi_v7_defconfig'}
+
+    def setup(self):
+        self.tests_config = {
+            'beaglebone-black': {
+                'configs': [self.MAINLINE, self.STABLE],
+                'tests': [
+                    {'name': 'boot'},
+                    {'name': 'usb', 'exclude_configs': [self.STABLE]},
+                    {'name': 'mmc', 'configs': [self.NEXT]},
+                ],
+            },
+            'armada-385-db-ap': {
+                'configs': [self.MAINLINE],
+                'tests': [
+                    {'name': 'boot'},
+                    {'name': 'boot'},
+                ],
+            },
+            'sama5d3-xplained': {
+                'configs': [self.MAINLINE],
+                'tests': [],
+            },
+        }
+
+    def test_make_plan(self):
+        plan = make_plan(self.tests_config, ['beaglebone-black',
+                                             'armada-385-db-ap',
+                                             'sama5d3-xplained'])
+
+        assert_equal([
+            'beaglebone-black--mainline--master--multi_v7_defconfig--boot',
+            'beaglebone-black--stable--linux-4.14.y--multi_v7_defconfig--boot',
+            'beaglebone-black--mainline--master--multi_v7_defconfig--usb',
+            'beaglebone-black--next--master--multi_v7_defconfig--mmc',
+            'armada-385-db-ap--mainline--master--multi_v7_defconfig--boot',
+        ], [spec.job_name for spec in plan])
+        assert_equal('stable', plan[1].tree)
+        assert_equal('linux-4.14.y', plan[1].branch)
+
+        # The configuration is left untouched
+        assert_equal([self.MAINLINE, self.STABLE],
+                     self.tests_config['beaglebone-black']['configs'])
+
+    def test_group_by_board(self):
+        plan = make_plan(self.tests_config, ['armada-385-db-ap',
+                                             'beaglebone-black'])
+        groups = group_by_board(plan)
+
+        assert_equal(['armada-385-db-ap', 'beaglebone-black'],
+                     list(groups.keys()))
+        assert_equal(4, len(groups['beaglebone-black']))
+
+    def test_summarize(self):
+        plan = make_plan(self.tests_config, ['beaglebone-black',
+                                             'armada-385-db-ap'])
+        summary = summarize(plan)
+
+        assert_equal(5, summary['total'])
+        assert_equal({'beaglebone-black': 4, 'armada-385-db-ap': 1},
+                     summary['boards'])
+        assert_equal({'mainline': 3, 'stable': 1, 'next': 1},
+                     summary['trees'])
+        assert_equal({'boot': 3, 'usb': 1, 'mmc': 1}, summary['tests'])
+        assert_equal(5, len(summary['jobs']))
+
+    def test_shard(self):
+        plan = []
+        for board in ['beaglebone-black', 'armada-385-db-ap',
+                      'sama5d3-xplained', 'sun8i-h3-orangepi-pc']:
+            self.tests_config[board] = {
+                'configs': [self.MAINLINE, self.STABLE, self.NEXT],
+                'tests': [{'name': 'boot'}, {'name': 'usb'},
+                          {'name': 'crypto-tcrypt'}],
+            }
+        plan = make_plan(self.tests_config, sorted(self.tests_config))
+        costs = {'boot': 10, 'usb': 10, 'crypto-tcrypt': 18}
+        cost = lambda spec: costs[spec.test]
+
+        shards = [shard(plan, i, 3, cost) for i in range(1, 4)]
+        jobs = [spec for s in shards for spec in s]
+
+        # Every job is in exactly one shard
+        assert_equal(len(plan), len(jobs))
+        assert_equal(set(plan), set(jobs))
+
+        # The shards are balanced
+        loads = [sum(cost(spec) for spec in s) for s in shards]
+        assert_true(max(loads) - min(loads) <= max(costs.values()))
+
+        # The partition doesn't depend on the order of the plan
+        assert_equal(set(shards[1]),
+                     set(shard(tuple(reversed(plan)), 2, 3, cost)))
+
+        # The shards keep the order of the plan
+        for s in shards:
+            assert_equal([spec for spec in plan if spec in s], list(s))
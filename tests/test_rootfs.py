@@ -17,7 +17,7 @@ class TestRootfsChooser(object):
             'test_plan': 'boot'
         }
 
-        mock.get(url, status_code=200)
+        mock.head(url, status_code=200)
 
         chooser = RootfsChooser()
         assert_equal(url, chooser.get_url(board))
@@ -30,7 +30,7 @@ class TestRootfsChooser(object):
             'test_plan': 'boot-nfs'
         }
 
-        mock.get(url, status_code=200)
+        mock.head(url, status_code=200)
 
         chooser = RootfsChooser()
         assert_equal(url, chooser.get_url(board))
@@ -59,8 +59,48 @@ class TestRootfsChooser(object):
             'test_plan': 'boot'
         }
 
-        mock.get(url, status_code=404)
+        mock.head(url, status_code=404)
 
         chooser = RootfsChooser()
         assert_raises(RootfsAccessError, chooser.get_url, board)
 
+
+    @requests_mock.mock()
+    def test_check_cached(self, mock):
+        url = "%s/%s.cpio.gz" % (self.BASE_URL, self.DEFAULT_ROOTFS)
+        nfs_url = "%s/%s.tar.gz" % (self.BASE_URL, self.DEFAULT_ROOTFS)
+        board = {
+            'rootfs': self.DEFAULT_ROOTFS,
+            'test_plan': 'boot'
+        }
+        nfs_board = {
+            'rootfs': self.DEFAULT_ROOTFS,
+            'test_plan': 'boot-nfs'
+        }
+
+        mock.head(url, status_code=200)
+        mock.head(nfs_url, status_code=200)
+
+        chooser = RootfsChooser()
+        for i in range(3):
+            assert_equal(url, chooser.get_url(board))
+            assert_equal(nfs_url, chooser.get_url(nfs_board))
+        assert_equal(2, mock.call_count)
+        assert_equal(['HEAD', 'HEAD'],
+                     [r.method for r in mock.request_history])
+
+    @requests_mock.mock()
+    def test_check_404_not_cached(self, mock):
+        url = "%s/%s.cpio.gz" % (self.BASE_URL, self.DEFAULT_ROOTFS)
+        board = {
+            'rootfs': self.DEFAULT_ROOTFS,
+            'test_plan': 'boot'
+        }
+
+        mock.head(url, status_code=404)
+
+        chooser = RootfsChooser()
+        assert_raises(RootfsAccessError, chooser.get_url, board)
+
+        mock.head(url, status_code=200)
+        assert_equal(url, chooser.get_url(board))
@@ -0,0 +1,128 @@
+import logging
+import random
+import threading
+import time
+
+from nose.tools import assert_equal, assert_true
+
+from crafter import RenderedJob
+from submitter import Submitter, TokenBucket
+from writers import Writer
+
+
+class FakeWriter(Writer):
+    def __init__(self, batch_size=1, fail=()):
+        super(FakeWriter, self).__init__({})
+        self.batch_size = batch_size
+        self.fail = fail
+        self.calls = 0
+        self.running = 0
+        self.max_running = 0
+        self.lock = threading.Lock()
+
+    def write_many(self, jobs, limit=None):
+        jobs = list(jobs)
+        with self.lock:
+            self.calls += 1
+            self.running += 1
+            self.max_running = max(self.max_running, self.running)
+        time.sleep(random.uniform(0, 0.01))
+        with self.lock:
+            self.running -= 1
+
+        if any(job.name in self.fail for job in jobs):
+            raise Exception('Broken batch')
+        for job in jobs:
+            logging.info("Sending %s" % job.name)
+
+        return [(job, ['sent/%s' % job.name]) for job in jobs]
+
+
+def get_jobs(count, consumed=None):
+    for i in range(count):
+        if consumed is not None:
+            consumed.append(i)
+        yield RenderedJob(None, {}, 'job-%d' % i, '')
+
+
+class TestTokenBucket(object):
+    def test_rate(self):
+        bucket = TokenBucket(100, burst=5)
+        start = time.monotonic()
+        for i in range(5):
+            bucket.acquire()
+        assert_true(time.monotonic() - start < 0.02)
+
+        for i in range(5):
+            bucket.acquire()
+        assert_true(time.monotonic() - start >= 0.04)
+
+
+class TestSubmitter(object):
+    def test_order(self):
+        writer = FakeWriter(batch_size=3)
+        submitter = Submitter(writer, workers=4)
+        results = list(submitter.submit_many(get_jobs(20)))
+        submitter.close()
+
+        assert_equal([job.name for job, out in results],
+                     ['job-%d' % i for i in range(20)])
+        assert_equal([out for job, out in results],
+                     [['sent/job-%d' % i] for i in range(20)])
+        assert_equal(writer.calls, 7)
+        assert_true(writer.max_running <= 4)
+        assert_equal(submitter.stats()['count'], 20)
+
+    def test_backpressure(self):
+        writer = FakeWriter()
+        submitter = Submitter(writer, workers=2)
+        consumed = []
+        results = submitter.submit_many(get_jobs(50, consumed))
+        next(results)
+        # Only a few jobs are taken ahead of the ones sent
+        assert_true(len(consumed) <= 2 * 2 + 2)
+        assert_equal(len(list(results)), 49)
+        submitter.close()
+
+    def test_failure(self):
+        writer = FakeWriter(batch_size=2, fail=('job-2',))
+        submitter = Submitter(writer, workers=2)
+        results = list(submitter.submit_many(get_jobs(5)))
+        submitter.close()
+        assert_equal([out is None for job, out in results],
+                     [False, False, True, True, False])
+
+    def test_rate_limit(self):
+        writer = FakeWriter()
+        submitter = Submitter(writer, workers=4, bucket=TokenBucket(200))
+        start = time.monotonic()
+        list(submitter.submit_many(get_jobs(10)))
+        submitter.close()
+        assert_true(time.monotonic() - start >= 9 / 200.)
+
+    def test_logs(self):
+        emitted = []
+
+        class Handler(logging.Handler):
+            def emit(self, record):
+                emitted.append((record.getMessage(),
+                                threading.current_thread()))
+
+        handler = Handler()
+        logger = logging.getLogger()
+        logger.addHandler(handler)
+        level = logger.level
+        logger.setLevel(logging.INFO)
+        try:
+            submitter = Submitter(FakeWriter(batch_size=2), workers=4)
+            list(submitter.submit_many(get_jobs(10)))
+            submitter.close()
+        finally:
+            logger.removeHandler(handler)
+            logger.setLevel(level)
+
+        # The records are emitted by the calling thread, in order
+        assert_equal([m for m, thread in emitted],
+                     ['Sending job-%d' % i for i in range(10)])
+        assert_true(all(thread is threading.current_thread()
+                        for m, thread in emitted))
@@ -2,6 +2,7 @@ from nose.tools import assert_equal, assert_raises
 import mock
 import xmlrpc
 
+from src.crafter import RenderedJob
 from src.writers import FileWriter, LavaWriter
 from src.writers import UnavailableError
 
@@ -41,6 +42,29 @@ class TestFileWriter(object):
             mocked_file.write.assert_called_with(self.CONTENT)
             assert_equal(results, [path])
 
+    def test_write_many(self):
+        cfg = {
+            'output_dir': self.OUTPUT_DIR,
+        }
+        jobs = [RenderedJob(None, dict(), '%s-%d' % (self.NAME, i),
+                            self.CONTENT) for i in range(3)]
+        limit = mock.MagicMock()
+
+        mo = mock.mock_open()
+        with mock.patch('builtins.open', mo, create=True) as mocked:
+            # The second job can't be saved
+            mocked.side_effect = [mo.return_value, IOError, mo.return_value]
+
+            writer = FileWriter(cfg)
+            results = list(writer.write_many(iter(jobs), limit))
+
+            assert_equal([job for job, out in results], jobs)
+            assert_equal([out for job, out in results],
+                         [['%s/%s.yaml' % (self.OUTPUT_DIR, job.name)]
+                          if i != 1 else None
+                          for i, job in enumerate(jobs)])
+            assert_equal(limit.__enter__.call_count, 3)
+
 
 class TestLavaWriter(object):
     DEVICE_TYPE = 'foo_bar'
@@ -75,17 +99,75 @@ class TestLavaWriter(object):
             'username': 'foobar',
             'token': 'deadcoffee42',
         }
-        response = {
-            'status': 'offline',
+        mock_proxy = mock.return_value
+        mock_proxy.scheduler.all_devices.return_value = [
+            ['%s_01' % self.DEVICE_TYPE, self.DEVICE_TYPE, 'offline', None,
+             True],
+            ['%s_02' % self.DEVICE_TYPE, self.DEVICE_TYPE, 'retired', None,
+             True],
+            ['other_01', 'other', 'idle', None, True],
+        ]
+
+        writer = LavaWriter(cfg)
+        assert_raises(UnavailableError, writer.write, board,
+                      self.NAME, self.CONTENT)
+        mock_proxy.scheduler.submit_job.assert_not_called()
+
+    @mock.patch('xmlrpc.client.ServerProxy')
+    def test_device_unknown(self, mock):
+        board = {
+            'device_type': self.DEVICE_TYPE,
+        }
+        cfg = {
+            'server': 'https://test.example.org/RPC2',
+            'username': 'foobar',
+            'token': 'deadcoffee42',
         }
 
         mock_proxy = mock.return_value
-        mock_proxy.scheduler.get_device_status.return_value = response
+        mock_proxy.scheduler.all_devices.return_value = []
 
         writer = LavaWriter(cfg)
         assert_raises(UnavailableError, writer.write, board,
                       self.NAME, self.CONTENT)
 
+    @mock.patch('xmlrpc.client.ServerProxy')
+    def test_device_snapshot(self, mock):
+        board = {
+            'device_type': self.DEVICE_TYPE,
+        }
+        cfg = {
+            'server': 'https://test.example.org/RPC2',
+            'username': 'foobar',
+            'token': 'deadcoffee42',
+            'web_ui_address': self.UI_ADDRESS,
+        }
+
+        mock_proxy = mock.return_value
+        # Only the second device is online
+        mock_proxy.scheduler.all_devices.return_value = [
+            ['%s_01' % self.DEVICE_TYPE, self.DEVICE_TYPE, 'offline', None,
+             True],
+            ['%s_02' % self.DEVICE_TYPE, self.DEVICE_TYPE, 'idle', None,
+             True],
+        ]
+        mock_proxy.scheduler.submit_job.return_value = 42
+
+        writer = LavaWriter(cfg)
+        for i in range(3):
+            writer.write(board, self.NAME, self.CONTENT)
+
+        assert_equal(mock_proxy.scheduler.all_devices.call_count, 1)
+        assert_equal(mock_proxy.scheduler.submit_job.call_count, 3)
+        mock_proxy.scheduler.get_device_status.assert_not_called()
+
+        # An expired snapshot is fetched again
+        cfg['device_status_ttl'] = '0'
+        writer = LavaWriter(cfg)
+        for i in range(2):
+            writer.write(board, self.NAME, self.CONTENT)
+        assert_equal(mock_proxy.scheduler.all_devices.call_count, 3)
+
     @mock.patch('xmlrpc.client.ServerProxy')
     def test_write_unique(self, mock):
         board = {
@@ -102,12 +184,15 @@ class TestLavaWriter(object):
         }
 
         mock_proxy = mock.return_value
+        mock_proxy.scheduler.all_devices.return_value = [
+            ['%s_01' % self.DEVICE_TYPE, self.DEVICE_TYPE, 'idle', None, True],
+        ]
         mock_proxy.scheduler.submit_job.return_value = 42
 
         writer = LavaWriter(cfg)
         results = writer.write(board, self.NAME, self.CONTENT)
 
-        mock_proxy.scheduler.get_device_status.assert_called_with('%s_01' % self.DEVICE_TYPE)
+        mock_proxy.scheduler.all_devices.assert_called_once_with()
         mock_proxy.scheduler.submit_job.assert_called_with(self.CONTENT)
         assert_equal(results, ['%s/scheduler/job/%d' % (self.UI_ADDRESS, 42)])
 
@@ -127,12 +212,94 @@ class TestLavaWriter(object):
         }
 
         mock_proxy = mock.return_value
+        mock_proxy.scheduler.all_devices.return_value = [
+            ['%s_01' % self.DEVICE_TYPE, self.DEVICE_TYPE, 'idle', None, True],
+        ]
         mock_proxy.scheduler.submit_job.return_value = (42, 84)
 
         writer = LavaWriter(cfg)
         results = writer.write(board, self.NAME, self.CONTENT)
 
-        mock_proxy.scheduler.get_device_status.assert_called_with('%s_01' % self.DEVICE_TYPE)
+        mock_proxy.scheduler.all_devices.assert_called_once_with()
         mock_proxy.scheduler.submit_job.assert_called_with(self.CONTENT)
         assert_equal(results, ['%s/scheduler/job/%d' % (self.UI_ADDRESS, 42),
                                '%s/scheduler/job/%d' % (self.UI_ADDRESS, 84)])
+
+    @mock.patch('xmlrpc.client.ServerProxy')
+    def test_write_many(self, mock):
+        board = {
+            'device_type': self.DEVICE_TYPE,
+        }
+        offline_board = {
+            'device_type': 'offline',
+        }
+        cfg = {
+            'server': 'https://test.example.org/RPC2',
+            'username': 'foobar',
+            'token': 'deadcoffee42',
+            'web_ui_address': self.UI_ADDRESS,
+            'submit_batch_size': '2',
+        }
+
+        mock_proxy = mock.return_value
+        mock_proxy.scheduler.all_devices.return_value = [
+            ['%s_01' % self.DEVICE_TYPE, self.DEVICE_TYPE, 'idle', None, True],
+            ['offline_01', 'offline', 'offline', None, True],
+        ]
+        mock_proxy.system.multicall.side_effect = [
+            [[42], [(43, 44)]],
+            [{'faultCode': 1, 'faultString': 'Invalid job'}],
+        ]
+
+        jobs = [RenderedJob(None, offline_board if i == 1 else board,
+                            '%s-%d' % (self.NAME, i), self.CONTENT)
+                for i in range(4)]
+        outbox = mock.MagicMock()
+        writer = LavaWriter(cfg, outbox)
+        results = list(writer.write_many(iter(jobs)))
+
+        # Only the job of the offline device is kept for later, not the one
+        # LAVA refused
+        outbox.put.assert_called_once_with(jobs[1])
+
+        # Two batches: jobs 0 and 2, then job 3
+        assert_equal(mock_proxy.system.multicall.call_count, 2)
+        calls = mock_proxy.system.multicall.call_args_list[0][0][0]
+        assert_equal([c['methodName'] for c in calls],
+                     ['scheduler.submit_job'] * 2)
+        mock_proxy.scheduler.submit_job.assert_not_called()
+
+        assert_equal([job for job, out in results], jobs)
+        assert_equal([out for job, out in results], [
+            ['%s/scheduler/job/42' % self.UI_ADDRESS],
+            None,
+            ['%s/scheduler/job/43' % self.UI_ADDRESS,
+             '%s/scheduler/job/44' % self.UI_ADDRESS],
+            None,
+        ])
+
+    @mock.patch('xmlrpc.client.ServerProxy')
+    def test_write_many_error(self, mock):
+        board = {
+            'device_type': self.DEVICE_TYPE,
+        }
+        cfg = {
+            'server': 'https://test.example.org/RPC2',
+            'username': 'foobar',
+            'token': 'deadcoffee42',
+            'web_ui_address': self.UI_ADDRESS,
+        }
+
+        mock_proxy = mock.return_value
+        mock_proxy.scheduler.all_devices.return_value = [
+            ['%s_01' % self.DEVICE_TYPE, self.DEVICE_TYPE, 'idle', None, True],
+        ]
+        mock_proxy.system.multicall.side_effect = \
+            xmlrpc.client.ProtocolError('url', 500, 'Internal error', {})
+
+        jobs = [RenderedJob(None, board, '%s-%d' % (self.NAME, i),
+                            self.CONTENT) for i in range(3)]
+        writer = LavaWriter(cfg)
+        results = list(writer.write_many(jobs))
+        assert_equal(mock_proxy.system.multicall.call_count, 1)
+        assert_equal([out for job, out in results], [None] * 3)